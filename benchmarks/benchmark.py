@@ -0,0 +1,342 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks of PyLogrus formatters, adapters and handlers.
+
+Usage::
+
+    python benchmarks/benchmark.py [-n ITERATIONS] [-k FILTER] [--save FILE] [--compare FILE] [--threshold PCT]
+
+Every benchmark reports the throughput (records per second), per-record latency percentiles
+and the peak of memory allocated during the run. Results can be saved as a baseline and later
+runs compared against it; the exit code is 1 if any benchmark regressed more than the threshold.
+"""
+
+from __future__ import print_function
+
+import argparse
+import io
+import itertools
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from pylogrus import PyLogrus, JsonFormatter, TextFormatter, AsyncHandler, BufferedStreamHandler, \
+    RingHandler  # noqa: E402
+from pylogrus.base import FieldsContext  # noqa: E402
+from pylogrus.msgpack_formatter import MsgPackFormatter  # noqa: E402
+
+try:
+    import tracemalloc
+except ImportError:  # PY2
+    tracemalloc = None
+
+timer = getattr(time, 'perf_counter', time.time)
+
+BENCHMARKS = OrderedDict()
+_logger_ids = itertools.count()
+
+
+def benchmark(name):
+    """Register a benchmark.
+
+    The decorated function prepares the benchmark and returns a callable which logs one record.
+    """
+    def decorator(func):
+        BENCHMARKS[name] = func
+        return func
+    return decorator
+
+
+def make_record(prefix='[API]', extra_fields=None):
+    record = logging.LogRecord('benchmark', logging.INFO, __file__, 42, "Request %s processed in %d ms",
+                               ('/api/users', 12), None)
+    record.prefix = prefix
+    record.extra_fields = extra_fields if extra_fields is not None else {'user': 'John Doe', 'request_id': 42}
+    return record
+
+
+def make_logger(handler):
+    logging.setLoggerClass(PyLogrus)
+
+    logger = logging.getLogger('benchmark.{}'.format(next(_logger_ids)))  # type: PyLogrus
+    logger.setLevel(logging.DEBUG)
+    logger.handlers = []
+    logger.propagate = False
+    logger.addHandler(handler)
+
+    return logger
+
+
+class NullStream(io.StringIO):
+
+    def write(self, s):
+        return len(s)
+
+
+@benchmark('JsonFormatter.format')
+def bench_json_format():
+    formatter = JsonFormatter()
+    record = make_record()
+    return lambda: formatter.format(record)
+
+
+@benchmark('JsonFormatter.format[all fields]')
+def bench_json_format_all_fields():
+    formatter = JsonFormatter(datefmt='Z', enabled_fields=[
+        'name', 'asctime', 'created', 'msecs', 'relativeCreated', 'levelno', 'levelname', 'thread', 'threadName',
+        'process', 'pathname', 'filename', 'module', 'lineno', 'funcName', 'message', 'exception', 'stacktrace'
+    ])
+    record = make_record()
+    return lambda: formatter.format(record)
+
+
+def _bench_json_context(context, formatter=None):
+    formatter = formatter or JsonFormatter()
+    fields = {'service': 'billing', 'request_id': 'c0ffee-42', 'user': {'id': 42, 'name': 'John Doe'},
+              'headers': {'user-agent': 'curl/8.0', 'accept': '*/*', 'x-forwarded-for': '10.0.0.1'}}
+    if context:
+        fields = FieldsContext(fields).resolve()
+    record = make_record(extra_fields=fields)
+    return lambda: formatter.format(record)
+
+
+@benchmark('JsonFormatter.format[dict fields]')
+def bench_json_format_dict_fields():
+    return _bench_json_context(False)
+
+
+@benchmark('JsonFormatter.format[bound fields]')
+def bench_json_format_bound_fields():
+    return _bench_json_context(True)
+
+
+@benchmark('MsgPackFormatter.format')
+def bench_msgpack_format():
+    formatter = MsgPackFormatter()
+    record = make_record()
+    return lambda: formatter.format(record)
+
+
+@benchmark('MsgPackFormatter.format[bound fields]')
+def bench_msgpack_format_bound_fields():
+    return _bench_json_context(True, MsgPackFormatter())
+
+
+@benchmark('JsonFormatter.format[exception]')
+def bench_json_format_exception():
+    formatter = JsonFormatter(enabled_fields=['asctime', 'levelname', 'message', 'exception', 'stacktrace'])
+    record = make_record()
+    try:
+        json.loads('{')
+    except ValueError:
+        record.exc_info = sys.exc_info()
+
+    def run():
+        record.exc_text = None
+        return formatter.format(record)
+    return run
+
+
+@benchmark('TextFormatter.format[colorized]')
+def bench_text_format_colorized():
+    formatter = TextFormatter(colorize=True)
+    record = make_record()
+    return lambda: formatter.format(record)
+
+
+@benchmark('TextFormatter.format[plain]')
+def bench_text_format_plain():
+    formatter = TextFormatter(colorize=False)
+    record = make_record()
+    return lambda: formatter.format(record)
+
+
+def _bench_format_time(datefmt):
+    formatter = TextFormatter(datefmt=datefmt)
+    record = make_record()
+    return lambda: formatter.formatTime(record, datefmt)
+
+
+@benchmark('BaseFormatter.formatTime[default]')
+def bench_format_time_default():
+    return _bench_format_time(None)
+
+
+@benchmark('BaseFormatter.formatTime[Z]')
+def bench_format_time_zulu():
+    return _bench_format_time('Z')
+
+
+@benchmark('BaseFormatter.formatTime[custom]')
+def bench_format_time_custom():
+    return _bench_format_time('%m/%d/%Y %I:%M:%S %p')
+
+
+def _bench_with_fields(depth):
+    log = make_logger(logging.NullHandler())
+
+    def run():
+        adapter = log
+        for i in range(depth):
+            adapter = adapter.withFields({'field{}'.format(i): i, 'payload': {'nested': [i, i]}})
+        adapter.info("chained logger")
+    return run
+
+
+@benchmark('CustomAdapter.withFields[depth=1]')
+def bench_with_fields_1():
+    return _bench_with_fields(1)
+
+
+@benchmark('CustomAdapter.withFields[depth=5]')
+def bench_with_fields_5():
+    return _bench_with_fields(5)
+
+
+@benchmark('CustomAdapter.debug[disabled]')
+def bench_disabled_level():
+    log = make_logger(logging.NullHandler()).withFields({'user': 'John Doe'})
+    log.logger.setLevel(logging.INFO)
+    return lambda: log.debug("disabled %s", 'level')
+
+
+def _bench_handler(handler, formatter):
+    handler.setFormatter(formatter)
+    log = make_logger(handler).withFields({'user': 'John Doe', 'request_id': 42}).withPrefix('[API]')
+    return lambda: log.info("Request %s processed in %d ms", '/api/users', 12)
+
+
+@benchmark('StreamHandler+JsonFormatter')
+def bench_stream_handler_json():
+    return _bench_handler(logging.StreamHandler(NullStream()), JsonFormatter())
+
+
+@benchmark('StreamHandler+TextFormatter')
+def bench_stream_handler_text():
+    return _bench_handler(logging.StreamHandler(NullStream()), TextFormatter())
+
+
+@benchmark('StreamHandler+JsonFormatter+TextFormatter')
+def bench_stream_handlers_json_text():
+    console = logging.StreamHandler(NullStream())
+    console.setFormatter(TextFormatter())
+    handler = logging.StreamHandler(NullStream())
+    handler.setFormatter(JsonFormatter())
+    log = make_logger(handler)
+    log.addHandler(console)
+    log = log.withFields({'user': 'John Doe', 'request_id': 42}).withPrefix('[API]')
+    return lambda: log.info("Request %s processed in %d ms", '/api/users', 12)
+
+
+@benchmark('BufferedStreamHandler+JsonFormatter')
+def bench_buffered_handler_json():
+    return _bench_handler(BufferedStreamHandler(NullStream()), JsonFormatter())
+
+
+@benchmark('AsyncHandler+JsonFormatter')
+def bench_async_handler_json():
+    return _bench_handler(AsyncHandler(NullStream(), overflow='drop_oldest'), JsonFormatter())
+
+
+@benchmark('RingHandler+JsonFormatter')
+def bench_ring_handler_json():
+    filename = os.path.join(tempfile.mkdtemp(), 'benchmark.ring')
+    return _bench_handler(RingHandler(filename, capacity=1024 * 1024), JsonFormatter())
+
+
+def percentile(values, pct):
+    return values[min(len(values) - 1, int(len(values) * pct / 100.0))]
+
+
+def run(func, iterations):
+    """Run the benchmark and return its metrics."""
+    for _ in range(min(iterations, 1000)):  # warm up
+        func()
+
+    latencies = []
+    start = timer()
+    for _ in range(iterations):
+        t = timer()
+        func()
+        latencies.append(timer() - t)
+    elapsed = timer() - start
+    latencies.sort()
+
+    result = OrderedDict([
+        ('ops', iterations / elapsed),
+        ('p50_us', percentile(latencies, 50) * 1e6),
+        ('p90_us', percentile(latencies, 90) * 1e6),
+        ('p99_us', percentile(latencies, 99) * 1e6),
+    ])
+
+    if tracemalloc is not None:
+        tracemalloc.start()
+        for _ in range(min(iterations, 1000)):
+            func()
+        result['peak_kib'] = tracemalloc.get_traced_memory()[1] / 1024.0
+        tracemalloc.stop()
+
+    return result
+
+
+def compare(results, baseline, threshold):
+    """Print changes against the baseline and return names of regressed benchmarks."""
+    regressed = []
+    print()
+    print("{:<40} {:>14} {:>14} {:>9}".format('benchmark', 'baseline ops', 'current ops', 'change'))
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        change = (result['ops'] / baseline[name]['ops'] - 1) * 100
+        mark = ''
+        if change < -threshold:
+            regressed.append(name)
+            mark = ' REGRESSION'
+        print("{:<40} {:>14.0f} {:>14.0f} {:>+8.1f}%{}".format(name, baseline[name]['ops'], result['ops'],
+                                                               change, mark))
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--iterations', type=int, default=20000, help="number of records per benchmark")
+    parser.add_argument('-k', '--filter', default='', help="run benchmarks whose name contains the substring")
+    parser.add_argument('--save', metavar='FILE', help="save results as a baseline")
+    parser.add_argument('--compare', metavar='FILE', help="compare results against the saved baseline")
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help="slowdown (in percent) treated as a regression (default: 10)")
+    args = parser.parse_args(argv)
+
+    results = OrderedDict()
+    print("{:<40} {:>12} {:>9} {:>9} {:>9} {:>10}".format('benchmark', 'records/s', 'p50 us', 'p90 us', 'p99 us',
+                                                          'peak KiB'))
+    for name, setup in BENCHMARKS.items():
+        if args.filter not in name:
+            continue
+        result = results[name] = run(setup(), args.iterations)
+        print("{:<40} {:>12.0f} {:>9.2f} {:>9.2f} {:>9.2f} {:>10}".format(
+            name, result['ops'], result['p50_us'], result['p90_us'], result['p99_us'],
+            '{:.1f}'.format(result['peak_kib']) if 'peak_kib' in result else '-'))
+
+    logging.shutdown()
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,5 +1,19 @@
 # -*- coding: utf-8 -*-
 
-from .base import PyLogrus
+import sys
+
+from .base import PyLogrus, Lazy
 from .json_formatter import JsonFormatter
+from .msgpack_formatter import MsgPackFormatter, MsgPackDecoder, iter_records
+from .record import PyLogrusRecord, record_factory
 from .text_formatter import *
+from .handlers import AsyncHandler, BufferedStreamHandler, BufferedFileHandler, DedupHandler, \
+    RotatingHandler
+from .filters import RateLimitFilter, SampleFilter
+from .multiprocess import CollectorHandler, LogCollector
+from .ring import RingHandler, read_ring
+from .instrumentation import metrics
+from .tracebacks import traceback_cache
+
+if sys.version_info >= (3, 8):  # Python version >= 3.8
+    from .aio import AsyncioHandler, ContextFieldsFilter, bind_fields, reset_fields
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import collections
+import contextvars
+import logging
+import sys
+import threading
+
+from .base import CustomAdapter, FieldsContext
+
+_context_fields = contextvars.ContextVar('pylogrus_context_fields', default=None)
+
+
+def bind_fields(fields):
+    """Add custom fields to log records of the current context.
+
+    Fields flow into tasks created from the current context.
+
+    :param fields: Custom fields
+    :type fields: dict
+    :return: Token to restore the previous fields
+    :rtype: contextvars.Token
+    """
+    context = _context_fields.get() or FieldsContext()
+    return _context_fields.set(context.with_fields(CustomAdapter._normalize(fields)))
+
+
+def reset_fields(token):
+    """Restore custom fields of the current context.
+
+    :param token: Token returned by :func:`bind_fields`
+    :type token: contextvars.Token
+    """
+    _context_fields.reset(token)
+
+
+class ContextFieldsFilter(logging.Filter):
+    """Add custom fields of the current context to a record.
+
+    Fields added by logger adapters take precedence over the context ones.
+    """
+
+    def filter(self, record):
+        context = _context_fields.get()
+        if context is not None:
+            fields = context.resolve()
+            extra_fields = getattr(record, 'extra_fields', None)
+            if isinstance(extra_fields, dict) and extra_fields:
+                fields = dict(fields)
+                fields.update(extra_fields)
+            record.extra_fields = fields
+        return True
+
+
+class AsyncioHandler(logging.Handler):
+
+    def __init__(self, stream=None):
+        """Handler which never blocks the event loop on output.
+
+        Records are formatted in the calling task and the lines are written by a task of the running
+        event loop, which moves the blocking writes to the default executor. Records logged when there's
+        no running loop are written synchronously. Custom fields bound by :func:`bind_fields` are added
+        to records.
+
+        :param stream: Output stream (``sys.stderr`` by default)
+        :type stream: file
+        """
+        super(AsyncioHandler, self).__init__()
+        self.stream = stream or sys.stderr
+        self.terminator = '\n'
+        self.addFilter(ContextFieldsFilter())
+        self._pending = collections.deque()
+        self._write_lock = threading.Lock()
+        self._loop = None
+        self._writer = None
+
+    @property
+    def qsize(self):
+        """Number of lines waiting to be written."""
+        return len(self._pending)
+
+    def emit(self, record):
+        try:
+            self._pending.append(self.format(record) + self.terminator)
+        except Exception:
+            self.handleError(record)
+            return
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+
+        if loop is not None:
+            self._loop = loop
+            self._schedule()
+        elif self._loop is not None and self._loop.is_running():
+            self._loop.call_soon_threadsafe(self._schedule)
+        else:
+            self.flush()
+
+    def _schedule(self):
+        """Start the writer task if there are pending lines (must be called in the loop thread)."""
+        writer = self._writer
+        if self._pending and (writer is None or writer.done() or writer.get_loop() is not self._loop):
+            self._writer = self._loop.create_task(self._write_pending(self._loop))
+
+    async def _write_pending(self, loop):
+        while self._pending:
+            await loop.run_in_executor(None, self._write, self._pop_pending())
+
+    def _pop_pending(self):
+        lines = []
+        while self._pending:
+            lines.append(self._pending.popleft())
+        return ''.join(lines)
+
+    def _write(self, data):
+        with self._write_lock:
+            try:
+                self.stream.write(data)
+                self.stream.flush()
+            except Exception:
+                self.handleError(logging.makeLogRecord({'msg': data}))
+
+    def flush(self):
+        """Write pending lines in the calling thread."""
+        data = self._pop_pending()
+        if data:
+            self._write(data)
+
+    async def aflush(self):
+        """Wait until pending lines are written without blocking the event loop."""
+        self._loop = asyncio.get_running_loop()
+        self._schedule()
+        while self._writer is not None and not self._writer.done():
+            await asyncio.shield(self._writer)
+
+    async def aclose(self):
+        """Write pending lines and close the handler."""
+        await self.aflush()
+        self.close()
+
+    def close(self):
+        self.flush()
+        super(AsyncioHandler, self).close()
@@ -1,13 +1,15 @@
 # -*- coding: utf-8 -*-
 
 import abc
-import copy
 import logging
+import logging.handlers
 import sys
 import time
 
 import six
 
+from .tracebacks import traceback_cache
+
 
 @six.add_metaclass(abc.ABCMeta)
 class PyLogrusBase(object):
@@ -33,13 +35,116 @@ class PyLogrusBase(object):
         """
 
 
+def _disabled(*args, **kwargs):
+    """Logging method of a disabled level."""
+
+
+class _LevelMethod(object):
+    """Logging method of adapter which is replaced by a no-op function if the level is disabled.
+
+    The check reads the cache of enabled levels of the logger directly, the logging module
+    clears it when a level of any logger is set (Python 3.7+). Enabled levels are handled by
+    methods of :class:`logging.LoggerAdapter`, so the caller of a record is detected as usual.
+    """
+
+    __slots__ = ('level', 'method')
+
+    def __init__(self, level, method):
+        self.level = level
+        self.method = method
+
+    def __get__(self, adapter, owner=None):
+        if adapter is None:
+            return self.method
+        logger = adapter.logger
+        try:
+            enabled = logger._cache[self.level] and not logger.disabled
+        except (AttributeError, KeyError):
+            enabled = logger.isEnabledFor(self.level)
+        return self.method.__get__(adapter, owner) if enabled else _disabled
+
+
+_UNKNOWN_CALLER = ("(unknown file)", 0, "(unknown function)", None) if six.PY3 else \
+    ("(unknown file)", 0, "(unknown function)")
+
+LOCATION_FIELDS = ('pathname', 'filename', 'module', 'lineno', 'funcName')
+
+# Handlers which pass whole records to other processes
+_SHIPPING_HANDLERS = (logging.handlers.SocketHandler, logging.handlers.HTTPHandler) + tuple(
+    getattr(logging.handlers, name) for name in ('QueueHandler',) if hasattr(logging.handlers, name))
+
+
+def _formatter_uses_location(formatter):
+    """Check if the formatter reads the location of the caller."""
+    if formatter is None:
+        return False
+    if isinstance(formatter, BaseFormatter):
+        return formatter.usesLocation()
+    fmt = getattr(formatter, '_fmt', None)
+    return fmt is None or any(field in fmt for field in LOCATION_FIELDS)
+
+
+def _handler_uses_location(handler):
+    """Check if the handler needs the location of the caller."""
+    if isinstance(handler, _SHIPPING_HANDLERS) or _formatter_uses_location(handler.formatter):
+        return True
+    target = getattr(handler, 'target', None)
+    return isinstance(target, logging.Handler) and _handler_uses_location(target)
+
+
 class PyLogrus(logging.Logger, PyLogrusBase):
 
+    #: Factory of log records, e.g. :func:`pylogrus.record.record_factory`. If ``None``,
+    #: the factory of the logging module is used
+    record_factory = None
+
+    #: Whether the location of the caller (``pathname``, ``lineno``, ``funcName``, etc.) is looked up.
+    #: If ``None``, it's looked up only if formatters of attached handlers use it
+    location = None
+
     def __init__(self, *args, **kwargs):
         extra = kwargs.pop('extra', None)
         self._extra_fields = extra or {}
         super(PyLogrus, self).__init__(*args, **kwargs)
 
+    def usesLocation(self):
+        """Check if the location of the caller is needed by handlers of the logger and its parents."""
+        if self.location is not None:
+            return self.location
+        c = self
+        while c:
+            for handler in c.handlers:
+                if _handler_uses_location(handler):
+                    return True
+            if not c.propagate:
+                break
+            c = c.parent
+        return False
+
+    def findCaller(self, stack_info=False, stacklevel=1):
+        """Find the stack frame of the caller, if the location of the caller is needed."""
+        if not stack_info and not self.usesLocation():
+            return _UNKNOWN_CALLER
+        if sys.version_info >= (3, 8):  # this frame is counted as a caller
+            return super(PyLogrus, self).findCaller(stack_info, stacklevel + 1)
+        if six.PY3:
+            return super(PyLogrus, self).findCaller(stack_info)
+        return super(PyLogrus, self).findCaller()
+
+    def makeRecord(self, name, level, fn, lno, msg, args, exc_info, func=None, extra=None, sinfo=None):
+        if self.record_factory is None:
+            if sinfo is None:
+                return super(PyLogrus, self).makeRecord(name, level, fn, lno, msg, args, exc_info, func, extra)
+            return super(PyLogrus, self).makeRecord(name, level, fn, lno, msg, args, exc_info, func, extra, sinfo)
+
+        rv = self.record_factory(name, level, fn, lno, msg, args, exc_info, func, sinfo)
+        if extra is not None:
+            for key in extra:
+                if (key in ["message", "asctime"]) or (key in rv.__dict__):
+                    raise KeyError("Attempt to overwrite %r in LogRecord" % key)
+                setattr(rv, key, extra[key])
+        return rv
+
     def withFields(self, fields=None):
         return CustomAdapter(self, fields)
 
@@ -47,9 +152,149 @@ class PyLogrus(logging.Logger, PyLogrusBase):
         return CustomAdapter(self, None, prefix)
 
 
+class Lazy(object):
+    """Value of custom field which is computed only when a record is emitted.
+
+    The function is called once per record, after the level of the record has been checked.
+    """
+
+    __slots__ = ('_func', '_args', '_kwargs')
+
+    def __init__(self, func, *args, **kwargs):
+        """
+        :param func: Function which returns the value of field
+        :type func: callable
+        """
+        self._func = func
+        self._args = args
+        self._kwargs = kwargs
+
+    def __call__(self):
+        return self._func(*self._args, **self._kwargs)
+
+
+class _RenderedMessage(object):
+    """Message of a record rendered for the given ``msg``, ``args`` and ``prefix`` of the record."""
+
+    __slots__ = ('msg', 'args', 'prefix', 'message', 'prefixed')
+
+    def __init__(self, msg=None, args=None, prefix=None, message=None, prefixed=None):
+        self.msg = msg
+        self.args = args
+        self.prefix = prefix
+        self.message = message
+        self.prefixed = prefixed
+
+    def __reduce__(self):
+        return _RenderedMessage, ()  # the arguments may be unpicklable, so the copy is an empty cache
+
+
+def _resolve_args(args):
+    """Compute :class:`Lazy` arguments of a message."""
+    if isinstance(args, tuple):
+        if any(isinstance(v, Lazy) for v in args):
+            return tuple(v() if isinstance(v, Lazy) else v for v in args)
+    elif isinstance(args, dict) and any(isinstance(v, Lazy) for v in args.values()):
+        return {k: v() if isinstance(v, Lazy) else v for k, v in args.items()}
+    return args
+
+
+def render_message(record):
+    """Return the message of the record and the message joined with the prefix of the record.
+
+    Arguments are interpolated and the prefix is joined once per record, the result is cached on
+    the record and shared by formatters of all handlers. :class:`Lazy` arguments are computed only
+    then. The cache is refreshed if ``msg``, ``args`` or ``prefix`` of the record are replaced.
+
+    :rtype: tuple
+    """
+    prefix = getattr(record, 'prefix', None)
+    rendered = getattr(record, '_rendered_message', None)
+    if rendered is None or rendered.msg is not record.msg or rendered.args is not record.args \
+            or rendered.prefix is not prefix:
+        if record.args:
+            record.args = _resolve_args(record.args)
+        message = record.getMessage()
+        prefixed = "{}{}".format(str(prefix) + ' ', message) if prefix else message
+        rendered = record._rendered_message = _RenderedMessage(record.msg, record.args, prefix, message, prefixed)
+    return rendered.message, rendered.prefixed
+
+
+class BoundFields(dict):
+    """Merged custom fields of :class:`FieldsContext` which are shared between records.
+
+    Formatters may keep encoded forms of the fields in ``encoded`` (keyed by a formatter-specific key),
+    since the fields are never modified.
+    """
+
+    __slots__ = ('encoded',)
+
+    def __init__(self, *args, **kwargs):
+        super(BoundFields, self).__init__(*args, **kwargs)
+        self.encoded = {}
+
+    def __reduce__(self):
+        return dict, (dict(self),)
+
+
+class FieldsContext(object):
+    """Immutable layer of custom fields which points to its parent layer.
+
+    Chaining of contextual loggers adds a new layer instead of copying the fields of the parent.
+    The merged fields are built once per layer, when a record is emitted.
+    """
+
+    __slots__ = ('_parent', '_fields', '_merged', 'lazy')
+
+    def __init__(self, fields=None, parent=None):
+        """
+        :param fields: Custom fields of the layer (names of fields should be normalized)
+        :type fields: dict | None
+        :param parent: Parent layer
+        :type parent: FieldsContext | None
+        """
+        self._parent = parent
+        self._fields = fields or {}
+        self._merged = None
+        self.lazy = (parent is not None and parent.lazy) or any(isinstance(v, Lazy) for v in self._fields.values())
+
+    def with_fields(self, fields):
+        """Return a new layer on top of the current one.
+
+        :param fields: Custom fields (names of fields should be normalized)
+        :type fields: dict
+        :rtype: FieldsContext
+        """
+        return FieldsContext(fields, self) if fields else self
+
+    def fields(self):
+        """Return the merged fields of the layer and its parents.
+
+        The returned dict is shared between records and must not be modified.
+
+        :rtype: dict
+        """
+        merged = self._merged
+        if merged is None:
+            merged = BoundFields(self._parent.fields() if self._parent is not None else ())
+            merged.update(self._fields)
+            self._merged = merged
+        return merged
+
+    def resolve(self):
+        """Return the merged fields with computed values of lazy fields.
+
+        :rtype: dict
+        """
+        fields = self.fields()
+        if self.lazy:
+            fields = {k: v() if isinstance(v, Lazy) else v for k, v in fields.items()}
+        return fields
+
+
 class CustomAdapter(logging.LoggerAdapter, PyLogrusBase):
 
-    def __init__(self, logger, extra=None, prefix=None):
+    def __init__(self, logger, extra=None, prefix=None, context=None):
         """Logger modifier.
 
         :param logger: Logger instance
@@ -58,26 +303,42 @@ class CustomAdapter(logging.LoggerAdapter, PyLogrusBase):
         :type extra: dict | None
         :param prefix: Prefix of log message
         :type prefix: str | None
+        :param context: Custom fields of the parent logger
+        :type context: FieldsContext | None
         """
         self._logger = logger
-        self._extra = self._normalize(extra)
+        self._context = (context or FieldsContext()).with_fields(self._normalize(extra))
         self._prefix = prefix
-        super(CustomAdapter, self).__init__(self._logger, {'extra_fields': self._extra, 'prefix': self._prefix})
+        super(CustomAdapter, self).__init__(self._logger, None)
+
+    @property
+    def extra(self):
+        return {'extra_fields': self._context.fields(), 'prefix': self._prefix}
+
+    @extra.setter
+    def extra(self, value):
+        """Extra values are built from the context and the prefix, so the value set by LoggerAdapter is ignored."""
 
     @staticmethod
     def _normalize(fields):
         return {k.lower(): v for k, v in fields.items()} if isinstance(fields, dict) else {}
 
     def withFields(self, fields=None):
-        extra = copy.deepcopy(self._extra)
-        extra.update(self._normalize(fields))
-        return CustomAdapter(self._logger, extra, self._prefix)
+        return CustomAdapter(self._logger, fields, self._prefix, self._context)
 
     def withPrefix(self, prefix=None):
-        return self if prefix is None else CustomAdapter(self._logger, self._extra, prefix)
+        return self if prefix is None else CustomAdapter(self._logger, None, prefix, self._context)
+
+    # Arguments aren't processed and custom fields aren't merged for disabled levels
+    debug = _LevelMethod(logging.DEBUG, logging.LoggerAdapter.debug)
+    info = _LevelMethod(logging.INFO, logging.LoggerAdapter.info)
+    warning = _LevelMethod(logging.WARNING, logging.LoggerAdapter.warning)
+    error = _LevelMethod(logging.ERROR, logging.LoggerAdapter.error)
+    exception = _LevelMethod(logging.ERROR, logging.LoggerAdapter.exception)
+    critical = _LevelMethod(logging.CRITICAL, logging.LoggerAdapter.critical)
 
     def process(self, msg, kwargs):
-        kwargs["extra"] = self.extra
+        kwargs["extra"] = {'extra_fields': self._context.resolve(), 'prefix': self._prefix}
         return msg, kwargs
 
 
@@ -87,6 +348,7 @@ class BaseFormatter(logging.Formatter):
     default_msec_format = '%s,%03d'
 
     def __init__(self, fmt=None, datefmt=None, style='%'):
+        self._time_cache = (None, None, None)
         if hasattr(logging, '_levelToName'):  # PY3
             self._level_names = {name: name for name in logging._levelToName.values()}
         else:
@@ -96,6 +358,11 @@ class BaseFormatter(logging.Formatter):
             super(BaseFormatter, self).__init__(fmt=fmt, datefmt=datefmt, style=style)
         else:
             super(BaseFormatter, self).__init__(fmt=fmt, datefmt=datefmt)
+        self._uses_location = any(field in self._fmt for field in LOCATION_FIELDS)
+
+    def usesLocation(self):
+        """Check if the format uses the location of the caller."""
+        return self._uses_location
 
     def formatTime(self, record, datefmt=None):
         """Return the creation time of the specified LogRecord as formatted text.
@@ -103,19 +370,37 @@ class BaseFormatter(logging.Formatter):
         If ``datefmt`` (a string) is specified, it is used to format the creation time of the record.
         If ``datefmt`` is 'Z' then creation time of the record will be in Zulu Time Zone.
         Otherwise, the ISO8601 format is used.
+
+        The formatted second is cached, so records created within the same second
+        only get the milliseconds spliced in.
         """
-        ct = self.converter(record.created)
+        second = int(record.created)
+        cached = self._time_cache
+        if cached[0] != second or cached[1] != datefmt:
+            ct = self.converter(record.created)
+            if datefmt:
+                t = time.strftime("%Y-%m-%dT%H:%M:%S" if datefmt == 'Z' else datefmt, ct)
+            else:
+                t = time.strftime(self.default_time_format, ct)
+            cached = self._time_cache = (second, datefmt, t)
+
+        t = cached[2]
         if datefmt:
             if datefmt == 'Z':
-                t = time.strftime("%Y-%m-%dT%H:%M:%S", ct)
-                s = "{}.{:03.0f}Z".format(t, record.msecs)
-            else:
-                s = time.strftime(datefmt, ct)
-        else:
-            t = time.strftime(self.default_time_format, ct)
-            s = self.default_msec_format % (t, record.msecs)
+                return "{}.{:03.0f}Z".format(t, record.msecs)
+            return t
+        return self.default_msec_format % (t, record.msecs)
 
-        return s
+    def formatException(self, ei):
+        """Format the specified exception information as text.
+
+        Stacks of tracebacks are taken from the cache shared by formatters
+        (:data:`pylogrus.tracebacks.traceback_cache`).
+        """
+        s = traceback_cache.format_exception(ei)
+        if s is None:
+            return super(BaseFormatter, self).formatException(ei)
+        return s[:-1] if s[-1:] == "\n" else s
 
     def override_level_names(self, mapping):
         """Rename level names.
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+
+import collections
+import logging
+import threading
+import time
+import weakref
+
+
+class KeyFilter(logging.Filter):
+
+    def __init__(self, key=('name', 'levelno', 'msg'), fields=None, max_keys=10000):
+        """Base class of filters which keep state per record key.
+
+        :param key: Attributes of record which make up the key, e.g. 'msg' (unformatted message template),
+                    'levelno', 'name' or 'prefix'
+        :type key: tuple
+        :param fields: Names of custom fields which make up the key
+        :type fields: tuple
+        :param max_keys: Maximum number of tracked keys (the least recently used keys are forgotten)
+        :type max_keys: int
+        """
+        super(KeyFilter, self).__init__()
+        self._key = tuple(key)
+        self._fields = tuple(k.lower() for k in fields or ())
+        self._max_keys = max_keys
+        self._states = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_key(self, record):
+        """Return the key of record."""
+        key = tuple(getattr(record, attr, None) for attr in self._key)
+        if self._fields:
+            extra_fields = getattr(record, 'extra_fields', None)
+            if not isinstance(extra_fields, dict):
+                extra_fields = {}
+            key += tuple(extra_fields.get(field) for field in self._fields)
+        try:
+            hash(key)
+        except TypeError:
+            key = repr(key)
+        return key
+
+    def _get_state(self, key, factory):
+        """Return the state of key (must be called under the lock)."""
+        state = self._states.pop(key, None)
+        if state is None:
+            state = factory()
+            if len(self._states) >= self._max_keys:
+                self._states.popitem(last=False)
+        self._states[key] = state
+        return state
+
+
+class RateLimitFilter(KeyFilter):
+
+    def __init__(self, rate, burst=None, key=('name', 'levelno', 'msg'), fields=None, max_keys=10000,
+                 summary_interval=1.0):
+        """Token bucket rate limit of records with the same key.
+
+        Suppressed records are reported by a summary record with the number of suppressed records in
+        ``suppressed`` field. The summary precedes the first record which passes after suppressed ones,
+        and a background thread checks every ``summary_interval`` seconds for keys whose burst has ended
+        and reports them even if no more records come. Summaries are passed only to the handlers and
+        loggers which have the filter.
+
+        :param rate: Number of records per second
+        :type rate: float
+        :param burst: Maximum number of records passed at once (``rate`` by default)
+        :type burst: int
+        :param summary_interval: Interval (in seconds) of checks for ended bursts. If ``None``, summaries are
+                                 only passed before records and by :meth:`flush`
+        :type summary_interval: float
+        """
+        super(RateLimitFilter, self).__init__(key, fields, max_keys)
+        self.rate = float(rate)
+        self.burst = float(burst or max(rate, 1))
+        self.summary_interval = summary_interval
+        self._timer = None
+
+    def filter(self, record):
+        if getattr(record, 'pylogrus_summary', False):
+            return True
+
+        now = time.time()
+        with self._lock:
+            # State: tokens, time of the last update, number of suppressed records, the last suppressed record
+            state = self._get_state(self.get_key(record), lambda: [self.burst, now, 0, None])
+            tokens = min(self.burst, state[0] + (now - state[1]) * self.rate)
+            state[1] = now
+            if tokens < 1:
+                state[0] = tokens
+                state[2] += 1
+                state[3] = record
+                self._start_timer()
+                return False
+            state[0] = tokens - 1
+            suppressed, state[2], state[3] = state[2], 0, None
+
+        if suppressed:
+            self.emit_summary(record, suppressed)
+        return True
+
+    def flush(self):
+        """Pass summaries of all suppressed records which haven't been reported yet."""
+        self._report(lambda state, now: True)
+
+    def _report(self, ready, stop_timer=False):
+        """Pass summaries of keys whose state is ready.
+
+        :return: Whether suppressed records are still pending
+        :rtype: bool
+        """
+        now = time.time()
+        reports = []
+        with self._lock:
+            for state in self._states.values():
+                if state[2] and ready(state, now):
+                    reports.append((state[3], state[2]))
+                    state[2], state[3] = 0, None
+            pending = any(state[2] for state in self._states.values())
+            if stop_timer and not pending:
+                self._timer = None
+
+        for record, suppressed in reports:
+            self.emit_summary(record, suppressed)
+        return pending
+
+    def _start_timer(self):
+        """Start the thread which reports ended bursts (must be called under the lock)."""
+        if self._timer is None and self.summary_interval:
+            self._timer = threading.Thread(target=_report_ended_bursts, args=(weakref.ref(self),),
+                                           name='pylogrus-rate-limit-filter')
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _owners(self):
+        """Return the handlers and loggers which have the filter."""
+        owners = []
+        for ref in list(getattr(logging, '_handlerList', [])):
+            handler = ref()
+            if handler is not None and any(f is self for f in handler.filters):
+                owners.append(handler)
+        loggers = [logging.getLogger()] + list(logging.Logger.manager.loggerDict.values())
+        owners += [logger for logger in loggers
+                   if isinstance(logger, logging.Logger) and any(f is self for f in logger.filters)]
+        return owners
+
+    def emit_summary(self, record, suppressed):
+        """Pass a summary record about suppressed records to the handlers and loggers which have the filter."""
+        summary = logging.LogRecord(record.name, record.levelno, record.pathname, record.lineno,
+                                    "%d records like '%s' have been suppressed", (suppressed, record.msg), None,
+                                    record.funcName)
+        summary.extra_fields = {'suppressed': suppressed}
+        summary.pylogrus_summary = True
+        for owner in self._owners():
+            if not isinstance(owner, logging.Handler) or summary.levelno >= owner.level:
+                owner.handle(summary)
+
+
+def _report_ended_bursts(ref):
+    """Periodically pass summaries of keys whose burst has ended, while records are suppressed."""
+    while True:
+        log_filter = ref()
+        if log_filter is None:
+            return
+        interval = log_filter.summary_interval
+        del log_filter
+        time.sleep(interval)
+
+        log_filter = ref()
+        if log_filter is None:
+            return
+        rate = log_filter.rate
+        if not log_filter._report(lambda state, now: state[0] + (now - state[1]) * rate >= 1, stop_timer=True):
+            return
+        del log_filter
+
+
+class SampleFilter(KeyFilter):
+
+    def __init__(self, rate, key=('name', 'levelno', 'msg'), fields=None, max_keys=10000):
+        """Deterministic sampling: pass the first record and then every ``rate``-th record with the same key.
+
+        :param rate: Sampling rate (1 of ``rate`` records passes)
+        :type rate: int
+        """
+        super(SampleFilter, self).__init__(key, fields, max_keys)
+        self.rate = max(int(rate), 1)
+
+    def filter(self, record):
+        with self._lock:
+            state = self._get_state(self.get_key(record), lambda: [0])
+            count = state[0]
+            state[0] = (count + 1) % self.rate
+        return count == 0
@@ -0,0 +1,611 @@
+# -*- coding: utf-8 -*-
+
+import calendar
+import collections
+import copy
+import gzip
+import io
+import logging
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+import weakref
+
+from six.moves import queue
+
+
+def _join(chunks):
+    """Join formatted records, which are bytes if the formatter writes binary records."""
+    return chunks[0][:0].join(chunks)
+
+
+class AsyncHandler(logging.Handler):
+
+    OVERFLOW_POLICIES = ('block', 'drop_newest', 'drop_oldest', 'sample')
+
+    def __init__(self, stream=None, capacity=10000, overflow='block', batch_size=256, flush_interval=0.5,
+                 sample_rate=10):
+        """Handler which formats and writes records in a background thread.
+
+        Callers only push records into a bounded queue. The worker thread formats them with the formatter
+        of the handler, joins them into batches and writes every batch with a single write and flush.
+        Binary records (e.g. of :class:`MsgPackFormatter`) are written into a binary stream
+        with ``terminator`` set as ``b''``.
+
+        :param stream: Output stream (``sys.stderr`` by default)
+        :type stream: file
+        :param capacity: Maximum number of records in the queue
+        :type capacity: int
+        :param overflow: Policy for a full queue: 'block' waits for free space, 'drop_newest' discards
+                         the new record, 'drop_oldest' discards the oldest queued record and 'sample'
+                         keeps every ``sample_rate``-th new record in place of the oldest one
+        :type overflow: str
+        :param batch_size: Maximum number of records written at once
+        :type batch_size: int
+        :param flush_interval: Maximum time (in seconds) a record waits in the queue
+        :type flush_interval: float
+        :param sample_rate: Sampling rate for the 'sample' policy
+        :type sample_rate: int
+        """
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError("Unknown overflow policy: {!r}".format(overflow))
+
+        super(AsyncHandler, self).__init__()
+        self.stream = stream or sys.stderr
+        self.terminator = '\n'
+        self.capacity = max(int(capacity), 1)
+        self.overflow = overflow
+        self.batch_size = max(int(batch_size), 1)
+        self.flush_interval = flush_interval
+        self.sample_rate = max(int(sample_rate), 1)
+        self.dropped = 0
+
+        self._overflows = 0
+        self._closed = False
+        self._queue = collections.deque()
+        self._wakeup = threading.Event()
+        self._not_full = threading.Condition(threading.Lock())
+        self._stats_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run, name='pylogrus-async-handler')
+        self._worker.daemon = True
+        self._worker.start()
+
+    @property
+    def qsize(self):
+        """Number of records waiting in the queue."""
+        return len(self._queue)
+
+    def handle(self, record):
+        """Conditionally emit the specified logging record.
+
+        Unlike :meth:`logging.Handler.handle`, the I/O lock of the handler isn't acquired,
+        because the record is only put into the queue.
+        """
+        rv = self.filter(record)
+        if isinstance(rv, logging.LogRecord):
+            record = rv
+        if rv:
+            self.emit(record)
+        return rv
+
+    def emit(self, record):
+        queue = self._queue
+        if len(queue) >= self.capacity and not self._make_room():
+            self._drop(record)
+            return
+        if self._closed:
+            self._drop(record)
+            return
+
+        queue.append(record)
+        if len(queue) >= self.batch_size:
+            self._wakeup.set()
+
+    def _make_room(self):
+        """Apply the overflow policy to the full queue.
+
+        :return: ``True`` if a new record can be put into the queue
+        :rtype: bool
+        """
+        if self.overflow == 'block':
+            self._wakeup.set()
+            with self._not_full:
+                while len(self._queue) >= self.capacity and not self._closed:
+                    self._not_full.wait(self.flush_interval)
+            return True
+
+        if self.overflow == 'sample':
+            with self._stats_lock:
+                self._overflows += 1
+                if self._overflows % self.sample_rate:
+                    return False
+        elif self.overflow == 'drop_newest':
+            return False
+
+        try:
+            oldest = self._queue.popleft()
+        except IndexError:
+            return True
+        self._drop(oldest)
+        return True
+
+    def _drop(self, record):
+        with self._stats_lock:
+            self.dropped += 1
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self._drain()
+        self._drain()
+
+    def _drain(self):
+        """Format and write all queued records by batches."""
+        queue = self._queue
+        with self._write_lock:
+            while queue:
+                lines = []
+                record = None
+                for _ in range(self.batch_size):
+                    try:
+                        record = queue.popleft()
+                    except IndexError:
+                        break
+                    try:
+                        lines.append(self.format(record) + self.terminator)
+                    except Exception:
+                        self.handleError(record)
+
+                if self.overflow == 'block':
+                    with self._not_full:
+                        self._not_full.notify_all()
+
+                if lines:
+                    try:
+                        self._write(_join(lines))
+                    except Exception:
+                        self.handleError(record)
+
+    def _write(self, data):
+        self.stream.write(data)
+        self.stream.flush()
+
+    def flush(self):
+        """Write all queued records in the calling thread."""
+        self._drain()
+
+    def close(self):
+        """Stop the worker thread after all queued records are written."""
+        if not self._closed:
+            self._closed = True
+            self._wakeup.set()
+            with self._not_full:
+                self._not_full.notify_all()
+            if self._worker is not threading.current_thread():
+                self._worker.join()
+        super(AsyncHandler, self).close()
+
+
+class _BufferedMixin(object):
+    """Join formatted records into large writes instead of one write and flush per record."""
+
+    def _init_buffer(self, buffer_size, capacity, flush_interval, flush_level):
+        self.terminator = '\n'
+        self.buffer_size = buffer_size
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.flush_level = flush_level
+        self._buffer = []
+        self._buffered = 0
+        self._timer = None
+
+    def emit(self, record):
+        try:
+            msg = self.format(record) + self.terminator
+        except Exception:
+            self.handleError(record)
+            return
+
+        self._buffer.append(msg)
+        self._buffered += len(msg)
+        if (record.levelno >= self.flush_level or self._buffered >= self.buffer_size
+                or len(self._buffer) >= self.capacity):
+            try:
+                self.flush()
+            except Exception:
+                self.handleError(record)
+        elif self.flush_interval and self._timer is None:
+            self._timer = threading.Timer(self.flush_interval, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _write(self, data):
+        self.stream.write(data)
+        self.stream.flush()
+
+    def flush(self):
+        """Write all buffered records."""
+        self.acquire()
+        try:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._buffer:
+                data = _join(self._buffer)
+                self._buffer = []
+                self._buffered = 0
+                self._write(data)
+        finally:
+            self.release()
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            super(_BufferedMixin, self).close()
+
+
+class BufferedStreamHandler(_BufferedMixin, logging.StreamHandler):
+
+    def __init__(self, stream=None, buffer_size=65536, capacity=1000, flush_interval=1.0,
+                 flush_level=logging.ERROR):
+        """Stream handler which writes formatted records by batches.
+
+        Buffered records are written when one of thresholds is reached or a record
+        with ``flush_level`` or higher level is logged. Binary records are written like
+        in :class:`AsyncHandler`.
+
+        :param stream: Output stream (``sys.stderr`` by default)
+        :type stream: file
+        :param buffer_size: Maximum size of buffered records (in characters)
+        :type buffer_size: int
+        :param capacity: Maximum number of buffered records
+        :type capacity: int
+        :param flush_interval: Maximum time (in seconds) a record stays in the buffer.
+                               Set as ``None`` to flush the buffer only by size and level
+        :type flush_interval: float
+        :param flush_level: Records with this level or higher are written immediately
+        :type flush_level: int
+        """
+        super(BufferedStreamHandler, self).__init__(stream)
+        self._init_buffer(buffer_size, capacity, flush_interval, flush_level)
+
+
+class BufferedFileHandler(_BufferedMixin, logging.FileHandler):
+
+    def __init__(self, filename, mode='a', encoding=None, delay=False, buffer_size=65536, capacity=1000,
+                 flush_interval=1.0, flush_level=logging.ERROR):
+        """File handler which writes formatted records by batches.
+
+        See :class:`BufferedStreamHandler` for the description of thresholds.
+        """
+        super(BufferedFileHandler, self).__init__(filename, mode, encoding, delay)
+        self._init_buffer(buffer_size, capacity, flush_interval, flush_level)
+
+    def _write(self, data):
+        if self.stream is None:
+            self.stream = self._open()
+        super(BufferedFileHandler, self)._write(data)
+
+
+class DedupHandler(logging.Handler):
+
+    def __init__(self, target, window=None, max_keys=1000):
+        """Handler which collapses repeated records before passing them to the target handler.
+
+        Records are repeated if they have the same logger name, level, message template, prefix and
+        custom fields. The first record is passed at once, the repeated ones are counted and passed as
+        a single record with ``repeated``, ``first_seen`` and ``last_seen`` custom fields, which appear
+        as fields in JSON output and as a suffix in text output.
+
+        :param target: Handler which gets records
+        :type target: logging.Handler
+        :param window: Time window (in seconds) in which records are collapsed. Summaries of runs are
+                       passed by a background thread when the window ends. If ``None``, only consecutive
+                       records are collapsed, and the summary of a run is passed with the next different
+                       record or on :meth:`flush`
+        :type window: float
+        :param max_keys: Maximum number of tracked records in the time window
+        :type max_keys: int
+        """
+        super(DedupHandler, self).__init__()
+        self.target = target
+        self.window = window
+        self.max_keys = max_keys
+        self._runs = collections.OrderedDict()
+        self._stopped = threading.Event()
+        self._timer = None
+
+    @staticmethod
+    def get_key(record):
+        extra_fields = getattr(record, 'extra_fields', None)
+        if isinstance(extra_fields, dict):
+            extra_fields = repr(sorted(extra_fields.items()))
+        return record.name, record.levelno, str(record.msg), getattr(record, 'prefix', None), extra_fields
+
+    def emit(self, record):
+        if record.levelno < self.target.level:
+            return
+        key = self.get_key(record)
+        if self.window is not None:
+            self._expire(record.created - self.window)
+            if self._timer is None:
+                self._timer = threading.Thread(target=self._run, args=(weakref.ref(self), self._stopped, self.window),
+                                               name='pylogrus-dedup-handler')
+                self._timer.daemon = True
+                self._timer.start()
+        run = self._runs.get(key)
+        if run is not None:
+            run[1] += 1
+            run[2] = record
+            return
+
+        if self.window is None or len(self._runs) >= self.max_keys:
+            self._flush_runs(1)
+        self._runs[key] = [record.created, 0, record]
+        self.target.handle(record)
+
+    def _expire(self, created):
+        """Pass summaries of runs started before the given time."""
+        while self._runs:
+            run = next(iter(self._runs.values()))
+            if run[0] > created:
+                break
+            self._flush_runs(1)
+
+    def _flush_runs(self, count=None):
+        """Pass summaries of the oldest runs (all runs by default)."""
+        for _ in range(len(self._runs) if count is None else min(count, len(self._runs))):
+            _, (first_seen, repeated, record) = self._runs.popitem(last=False)
+            if repeated:
+                self.target.handle(self._make_summary(record, first_seen, repeated))
+
+    @staticmethod
+    def _run(ref, stopped, window):
+        """Pass summaries of runs when their time window ends, even if no more records come."""
+        while not stopped.wait(min(window, 1.0)):
+            handler = ref()
+            if handler is None:
+                return
+            # A busy lock means a record is being handled, which expires the windows itself
+            # (or the handler is being closed, which waits for this thread)
+            if handler.lock.acquire(False):
+                try:
+                    handler._expire(time.time() - window)
+                finally:
+                    handler.lock.release()
+            del handler
+
+    def _make_summary(self, record, first_seen, repeated):
+        summary = copy.copy(record)
+        summary.exc_info = None
+        summary.exc_text = None
+        fields = dict(getattr(record, 'extra_fields', None) or {})
+        fields['repeated'] = repeated
+        fields['first_seen'] = self._format_time(first_seen)
+        fields['last_seen'] = self._format_time(record.created)
+        summary.extra_fields = fields
+        return summary
+
+    def _format_time(self, created):
+        formatter = self.target.formatter
+        if formatter is None:
+            return created
+        return formatter.formatTime(logging.makeLogRecord({'created': created, 'msecs': (created % 1) * 1000}),
+                                    formatter.datefmt)
+
+    def flush(self):
+        """Pass summaries of all repeated records and flush the target handler."""
+        self.acquire()
+        try:
+            self._flush_runs()
+        finally:
+            self.release()
+        self.target.flush()
+
+    def close(self):
+        self._stopped.set()
+        if self._timer is not None:
+            self._timer.join()
+            self._timer = None
+        try:
+            self.flush()
+        finally:
+            super(DedupHandler, self).close()
+
+
+class RotatingHandler(logging.FileHandler):
+
+    COMPRESSORS = ('gzip', 'zstd')
+    INTERVALS = {'S': 1, 'M': 60, 'H': 3600, 'D': 86400}
+
+    def __init__(self, filename, max_bytes=0, when=None, interval=1, utc=False, backup_count=0, max_total_bytes=0,
+                 compress='gzip', encoding=None, delay=False, mode='a'):
+        """File handler which rotates the file by size or time and compresses rotated segments in background.
+
+        Rotation is only a rename of the file to a segment named by the time the file was started
+        (e.g. ``app.log.20240131-235959``), so existing segments aren't renamed. Compression of segments
+        and removal of old ones happen in a background thread.
+
+        :param filename: Name of log file
+        :type filename: str
+        :param max_bytes: Rotate the file before it exceeds this size (in characters of formatted records).
+                          0 disables rotation by size
+        :type max_bytes: int
+        :param when: Rotate the file every ``interval`` seconds ('S'), minutes ('M'), hours ('H'), days ('D')
+                     or at midnight ('midnight'). ``None`` disables rotation by time
+        :type when: str
+        :param interval: Number of time units between rotations
+        :type interval: int
+        :param utc: Use UTC for midnight and names of segments instead of the local time
+        :type utc: bool
+        :param backup_count: Maximum number of kept segments (0 means unlimited)
+        :type backup_count: int
+        :param max_total_bytes: Maximum total size of kept segments (0 means unlimited)
+        :type max_total_bytes: int
+        :param compress: Compression of segments: 'gzip', 'zstd' or ``None``.
+                         If the ``zstandard`` package is not installed, gzip is used
+        :type compress: str
+        :param mode: Mode of opening the file: 'a' or 'ab' for formatters which return bytes
+                     (set ``terminator`` as ``b''`` in that case)
+        :type mode: str
+        """
+        if compress is not None and compress not in self.COMPRESSORS:
+            raise ValueError("Unknown compression: {!r}".format(compress))
+        if when is not None and when.upper() not in self.INTERVALS and when.upper() != 'MIDNIGHT':
+            raise ValueError("Invalid rollover interval specified: {!r}".format(when))
+
+        super(RotatingHandler, self).__init__(filename, mode, encoding, delay)
+        self.terminator = '\n'
+        self.max_bytes = max_bytes
+        self.when = when.upper() if when is not None else None
+        self.interval = max(int(interval), 1)
+        self.utc = utc
+        self.backup_count = backup_count
+        self.max_total_bytes = max_total_bytes
+        self.compress = compress
+        if compress == 'zstd':
+            try:
+                import zstandard  # noqa: F401
+            except ImportError:
+                self.compress = 'gzip'
+
+        self._segment_pattern = re.compile(re.escape(os.path.basename(self.baseFilename)) +
+                                           r'\.\d{8}-\d{6}(\.\d+)?(\.gz|\.zst)?$')
+        self._size = os.path.getsize(self.baseFilename) if os.path.exists(self.baseFilename) else 0
+        self._started_at = time.time()
+        self._rollover_at = self._compute_rollover(self._started_at)
+        self._segments = queue.Queue()
+        self._worker = None
+
+    def _compute_rollover(self, now):
+        """Return the time of the next rotation by time."""
+        if self.when is None:
+            return float('inf')
+        if self.when != 'MIDNIGHT':
+            return now + self.interval * self.INTERVALS[self.when]
+        t = time.gmtime(now) if self.utc else time.localtime(now)
+        midnight = (t.tm_year, t.tm_mon, t.tm_mday + self.interval, 0, 0, 0, 0, 0, -1)
+        return calendar.timegm(midnight) if self.utc else time.mktime(midnight)
+
+    def emit(self, record):
+        try:
+            msg = self.format(record) + self.terminator
+            if (self.max_bytes and self._size and self._size + len(msg) > self.max_bytes
+                    or record.created >= self._rollover_at):
+                self.doRollover(record.created)
+                if hasattr(self.formatter, 'reset'):
+                    msg = self.format(record) + self.terminator  # the formatter has started a new stream
+            self._write(msg)
+            self._size += len(msg)
+        except Exception:
+            self.handleError(record)
+
+    def _write(self, data):
+        if self.stream is None:
+            self.stream = self._open()
+        self.stream.write(data)
+        self.flush()
+
+    def doRollover(self, now=None):
+        """Rename the file to a new segment and pass the segment to the background thread."""
+        now = time.time() if now is None else now
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+        if self._size and os.path.exists(self.baseFilename):
+            segment = self._segment_name(self._started_at)
+            os.rename(self.baseFilename, segment)
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name='pylogrus-rotating-handler')
+                self._worker.daemon = True
+                self._worker.start()
+            self._segments.put(segment)
+
+        if hasattr(self.formatter, 'reset'):
+            self.formatter.reset()
+        self._size = 0
+        self._started_at = now
+        self._rollover_at = self._compute_rollover(now)
+
+    def _segment_name(self, started_at):
+        """Return a free name of segment for the file started at the given time."""
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.gmtime(started_at) if self.utc else time.localtime(started_at))
+        name = base = '{}.{}'.format(self.baseFilename, stamp)
+        num = 0
+        while any(os.path.exists(name + suffix) for suffix in ('', '.gz', '.zst')):
+            num += 1
+            name = '{}.{}'.format(base, num)
+        return name
+
+    def get_segments(self):
+        """Return paths of rotated segments from the oldest to the newest one.
+
+        :rtype: list
+        """
+        dirname = os.path.dirname(self.baseFilename)
+        paths = [os.path.join(dirname, name) for name in os.listdir(dirname) if self._segment_pattern.match(name)]
+        return sorted(paths, key=lambda path: (os.path.getmtime(path), path))
+
+    def _run(self):
+        while True:
+            segment = self._segments.get()
+            if segment is None:
+                break
+            try:
+                self._compress(segment)
+                self._remove_old_segments()
+            except Exception:
+                self.handleError(logging.makeLogRecord({'msg': segment}))
+
+    def _compress(self, segment):
+        if self.compress is None or not os.path.exists(segment):
+            return
+
+        target = segment + ('.zst' if self.compress == 'zstd' else '.gz')
+        temp = target + '.tmp'
+        stat = os.stat(segment)
+        with io.open(segment, 'rb') as src, io.open(temp, 'wb') as dst:
+            if self.compress == 'zstd':
+                import zstandard
+                zstandard.ZstdCompressor().copy_stream(src, dst)
+            else:
+                with gzip.GzipFile(os.path.basename(segment), 'wb', fileobj=dst, mtime=stat.st_mtime) as gz:
+                    shutil.copyfileobj(src, gz, 1024 * 1024)
+        os.utime(temp, (stat.st_atime, stat.st_mtime))
+        os.rename(temp, target)
+        os.remove(segment)
+
+    def _remove_old_segments(self):
+        """Remove the oldest segments which exceed the count or total size limits."""
+        if not self.backup_count and not self.max_total_bytes:
+            return
+
+        segments = [(path, os.path.getsize(path)) for path in self.get_segments()]
+        excess = len(segments) - self.backup_count if self.backup_count else 0
+        total = sum(size for _, size in segments)
+        for path, size in segments:
+            if excess <= 0 and (not self.max_total_bytes or total <= self.max_total_bytes):
+                break
+            os.remove(path)
+            excess -= 1
+            total -= size
+
+    def close(self):
+        """Close the file and wait until rotated segments are compressed."""
+        self.acquire()
+        try:
+            worker, self._worker = self._worker, None
+            if worker is not None:
+                self._segments.put(None)
+        finally:
+            self.release()
+        if worker is not None and worker is not threading.current_thread():
+            worker.join()
+        super(RotatingHandler, self).close()
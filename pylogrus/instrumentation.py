@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+
+import bisect
+import functools
+import logging
+import sys
+import threading
+
+from .base import BaseFormatter, PyLogrus
+from .filters import RateLimitFilter, SampleFilter
+from .handlers import AsyncHandler, RotatingHandler, _BufferedMixin
+from .json_formatter import JsonFormatter
+from .multiprocess import CollectorHandler
+from .ring import RingHandler
+from .text_formatter import TextFormatter
+
+if sys.version_info >= (3, 3):  # Python version >= 3.3
+    from time import perf_counter as _timer
+else:
+    from timeit import default_timer as _timer
+
+_MISSING = object()
+
+# Upper bounds of buckets of timing histograms (in seconds)
+BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 0.1, 1.0)
+
+COUNTERS = {
+    'pylogrus_records_total': "Records passed to handlers by PyLogrus loggers.",
+    'pylogrus_dropped_total': "Records dropped by filters and handlers.",
+    'pylogrus_written_bytes_total': "Size of data written by handlers (characters for text streams).",
+}
+HISTOGRAMS = {
+    'pylogrus_format_seconds': "Time spent in formatting of records.",
+    'pylogrus_serialize_seconds': "Time spent in JSON serialization.",
+    'pylogrus_format_time_seconds': "Time spent in formatting of record creation time.",
+    'pylogrus_write_seconds': "Time spent in writing by handlers.",
+}
+GAUGES = {
+    'pylogrus_queue_depth': "Records waiting in queues of handlers.",
+}
+
+
+class Metrics(object):
+
+    def __init__(self):
+        """Opt-in counters and timing histograms of PyLogrus.
+
+        When metrics are enabled, methods on the hot path of formatters, handlers, filters and loggers
+        are wrapped to count and time their calls. Disabling restores the original methods, so disabled
+        metrics cost nothing.
+        """
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._patches = []
+
+    @property
+    def enabled(self):
+        return bool(self._patches)
+
+    def enable(self):
+        """Start collecting metrics."""
+        with self._lock:
+            if self._patches:
+                return
+
+            self._patch(PyLogrus, 'callHandlers', self._count_records)
+            for cls in (AsyncHandler, CollectorHandler, RingHandler):
+                self._patch(cls, '_drop', self._count_dropped)
+            for cls in (RateLimitFilter, SampleFilter):
+                self._patch(cls, 'filter', self._count_filtered)
+
+            for cls in (JsonFormatter, TextFormatter):
+                self._patch(cls, 'format', self._timed('pylogrus_format_seconds', 'formatter'))
+            self._patch(JsonFormatter, '_JsonFormatter__obj2json',
+                        self._timed('pylogrus_serialize_seconds', 'formatter'))
+            self._patch(BaseFormatter, 'formatTime', self._timed('pylogrus_format_time_seconds', 'formatter'))
+
+            write_classes = [AsyncHandler, _BufferedMixin, RotatingHandler, CollectorHandler, RingHandler]
+            if sys.version_info >= (3, 8):  # Python version >= 3.8
+                from .aio import AsyncioHandler
+                write_classes.append(AsyncioHandler)
+            for cls in write_classes:
+                self._patch(cls, '_write', self._timed_write)
+
+    def disable(self):
+        """Stop collecting metrics. Collected values are kept until :meth:`reset`."""
+        with self._lock:
+            while self._patches:
+                cls, name, original = self._patches.pop()
+                if original is _MISSING:
+                    delattr(cls, name)
+                else:
+                    setattr(cls, name, original)
+
+    def reset(self):
+        """Forget collected values."""
+        with self._lock:
+            self._counters = {}
+            self._histograms = {}
+
+    def _patch(self, cls, name, make_wrapper):
+        func = getattr(cls, name)
+        wrapper = functools.wraps(func)(make_wrapper(func))
+        self._patches.append((cls, name, cls.__dict__.get(name, _MISSING)))
+        setattr(cls, name, wrapper)
+
+    def inc(self, name, labels, value=1):
+        """Increase the counter with the given labels.
+
+        :param name: Name of counter
+        :type name: str
+        :param labels: Values of labels (tuple of (label, value) tuples)
+        :type labels: tuple
+        :param value: Increment
+        :type value: int
+        """
+        with self._lock:
+            counter = self._counters.setdefault(name, {})
+            counter[labels] = counter.get(labels, 0) + value
+
+    def observe(self, name, labels, value):
+        """Add the value (in seconds) to the histogram with the given labels."""
+        with self._lock:
+            histogram = self._histograms.setdefault(name, {})
+            state = histogram.get(labels)
+            if state is None:
+                state = histogram[labels] = [0] * (len(BUCKETS) + 3)  # buckets, +Inf bucket, sum and count
+            state[bisect.bisect_left(BUCKETS, value)] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def _count_records(self, func):
+        def call_handlers(logger, record):
+            self.inc('pylogrus_records_total', (('logger', record.name), ('level', record.levelname)))
+            return func(logger, record)
+        return call_handlers
+
+    def _count_dropped(self, func):
+        def drop(handler, record):
+            self.inc('pylogrus_dropped_total', (('logger', record.name), ('level', record.levelname),
+                                                ('reason', type(handler).__name__)))
+            return func(handler, record)
+        return drop
+
+    def _count_filtered(self, func):
+        def filter_record(log_filter, record):
+            rv = func(log_filter, record)
+            if not rv:
+                self.inc('pylogrus_dropped_total', (('logger', record.name), ('level', record.levelname),
+                                                    ('reason', type(log_filter).__name__)))
+            return rv
+        return filter_record
+
+    def _timed(self, name, label):
+        def make_wrapper(func):
+            def timed(obj, *args, **kwargs):
+                start = _timer()
+                try:
+                    return func(obj, *args, **kwargs)
+                finally:
+                    self.observe(name, ((label, type(obj).__name__),), _timer() - start)
+            return timed
+        return make_wrapper
+
+    def _timed_write(self, func):
+        def write(handler, data):
+            start = _timer()
+            try:
+                return func(handler, data)
+            finally:
+                labels = (('handler', type(handler).__name__),)
+                self.observe('pylogrus_write_seconds', labels, _timer() - start)
+                self.inc('pylogrus_written_bytes_total', labels, len(data))
+        return write
+
+    @staticmethod
+    def _queue_depths():
+        """Return queue depths of live handlers, summed by class and name of handler."""
+        depths = {}
+        for ref in list(getattr(logging, '_handlerList', [])):
+            handler = ref()
+            if handler is not None and hasattr(handler, 'qsize'):
+                labels = (('handler', type(handler).__name__), ('name', handler.get_name() or ''))
+                depths[labels] = depths.get(labels, 0) + handler.qsize
+        return depths
+
+    def snapshot(self):
+        """Return collected values.
+
+        Counters and gauges are mappings of labels to values. Histograms are mappings of labels to dicts
+        with ``count``, ``sum`` (in seconds) and ``buckets`` (list of (upper bound, cumulative count) tuples).
+        Labels are tuples of (label, value) tuples.
+
+        :rtype: dict
+        """
+        with self._lock:
+            result = {name: dict(counter) for name, counter in self._counters.items()}
+            for name, histogram in self._histograms.items():
+                result[name] = {}
+                for labels, state in histogram.items():
+                    buckets = []
+                    cumulative = 0
+                    for bound, count in zip(BUCKETS + (float('inf'),), state[:-2]):
+                        cumulative += count
+                        buckets.append((bound, cumulative))
+                    result[name][labels] = {'count': state[-1], 'sum': state[-2], 'buckets': buckets}
+        result['pylogrus_queue_depth'] = self._queue_depths()
+        return result
+
+    def to_prometheus(self):
+        """Return collected values in the Prometheus text exposition format.
+
+        :rtype: str
+        """
+        snapshot = self.snapshot()
+        lines = []
+        for kind, metrics in (('counter', COUNTERS), ('histogram', HISTOGRAMS), ('gauge', GAUGES)):
+            for name in sorted(metrics):
+                lines.append('# HELP {} {}'.format(name, metrics[name]))
+                lines.append('# TYPE {} {}'.format(name, kind))
+                for labels, value in sorted(snapshot.get(name, {}).items()):
+                    if kind != 'histogram':
+                        lines.append('{}{} {}'.format(name, _format_labels(labels), _format_value(value)))
+                        continue
+                    for bound, count in value['buckets']:
+                        le = '+Inf' if bound == float('inf') else repr(bound)
+                        lines.append('{}_bucket{} {}'.format(name, _format_labels(labels + (('le', le),)), count))
+                    lines.append('{}_sum{} {}'.format(name, _format_labels(labels), _format_value(value['sum'])))
+                    lines.append('{}_count{} {}'.format(name, _format_labels(labels), value['count']))
+        return '\n'.join(lines) + '\n'
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                          for k, v in labels) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+metrics = Metrics()
@@ -1,16 +1,59 @@
 # -*- coding: utf-8 -*-
 
 from functools import partial
+from operator import attrgetter
 import json
 
-from .base import BaseFormatter
+import six
+
+from .base import BaseFormatter, BoundFields, LOCATION_FIELDS, render_message
+from .tracebacks import traceback_cache
+
+SERIALIZERS = ('orjson', 'rapidjson', 'ujson', 'json')
+
+_USED_ONCE = object()  # marks bound fields which have been formatted once (they are encoded when reused)
+
+
+def _make_serializer(name, indent, sort_keys, default):
+    """Return a function which serializes obj to a JSON string using the given backend.
+
+    :return: Serializing function or ``None`` if the backend isn't installed or can't honor the options
+    """
+    try:
+        if name == 'orjson':
+            import orjson
+            if indent not in (None, 2):
+                return None
+            option = orjson.OPT_NON_STR_KEYS
+            option |= orjson.OPT_INDENT_2 if indent else 0
+            option |= orjson.OPT_SORT_KEYS if sort_keys else 0
+            return lambda obj: orjson.dumps(obj, default=default, option=option).decode('utf-8')
+        if name == 'rapidjson':
+            import rapidjson
+            return partial(rapidjson.dumps, indent=indent, sort_keys=sort_keys, default=default,
+                           mapping_mode=rapidjson.MM_COERCE_KEYS_TO_STRINGS)
+        if name == 'ujson':
+            import ujson
+            dumps = partial(ujson.dumps, indent=indent or 0, sort_keys=sort_keys, default=default,
+                            escape_forward_slashes=False)
+            dumps({})  # old releases don't support the ``default`` argument
+            return dumps
+    except (ImportError, TypeError):
+        return None
+
+    return json.JSONEncoder(indent=indent, sort_keys=sort_keys, default=default).encode
 
 
 class JsonFormatter(BaseFormatter):
 
     __BASIC_FIELDS = ['name', 'asctime', 'levelname', 'message', 'exception', 'stacktrace']
+    __RECORD_FIELDS = ('name', 'asctime', 'created', 'msecs', 'relativeCreated', 'levelno', 'levelname', 'thread',
+                       'threadName', 'process', 'pathname', 'filename', 'module', 'lineno', 'funcName', 'message',
+                       'exception', 'stacktrace', 'traceback')
+    __NESTED_FIELDS = ('traceback',)
 
-    def __init__(self, datefmt=None, enabled_fields=None, indent=None, sort_keys=False):
+    def __init__(self, datefmt=None, enabled_fields=None, indent=None, sort_keys=False, serializer='json',
+                 default=None, max_frames=None, max_depth=None):
         """Initialize the formatter with specified fields and date format.
 
         :param datefmt: Date format (set as 'Z' to get the Zulu format)
@@ -22,41 +65,83 @@ class JsonFormatter(BaseFormatter):
         :type indent: int
         :param sort_keys: Sort keys in log record
         :type sort_keys: bool
+        :param serializer: JSON backend: 'json', 'orjson', 'rapidjson', 'ujson', 'auto' (the fastest installed one)
+                           or a callable which takes a dict and returns a JSON string.
+                           If the backend is not installed, the standard ``json`` module is used
+        :type serializer: str | callable
+        :param default: Function that gets called for objects that can't otherwise be serialized.
+                        By default such objects are converted with ``str``
+        :type default: callable
+        :param max_frames: Maximum number of frames of every exception in the ``traceback`` field
+                           (the innermost ones are kept)
+        :type max_frames: int
+        :param max_depth: Maximum number of chained exceptions in the ``traceback`` field
+        :type max_depth: int
         :return: Log record as JSON string
         :rtype: str
         """
         super(JsonFormatter, self).__init__(datefmt=datefmt)
         self._indent = indent
         self._sort_keys = sort_keys
-        self.__compose_record = partial(self.__prepare_record, enabled_fields=enabled_fields or self.__BASIC_FIELDS)
-
-    def __prepare_record(self, record, enabled_fields):
-        """Prepare log record with given fields."""
-        message = record.getMessage()
-        if hasattr(record, 'prefix'):
-            message = "{}{}".format((str(record.prefix) + ' ') if record.prefix else '', message)
-
-        obj = {
-            'name': record.name,
-            'asctime': self.formatTime(record, self.datefmt),
-            'created': record.created,
-            'msecs': record.msecs,
-            'relativeCreated': record.relativeCreated,
-            'levelno': record.levelno,
-            'levelname': self._level_names[record.levelname],
-            'thread': record.thread,
-            'threadName': record.threadName,
-            'process': record.process,
-            'pathname': record.pathname,
-            'filename': record.filename,
-            'module': record.module,
-            'lineno': record.lineno,
-            'funcName': record.funcName,
-            'message': message,
-            'exception': record.exc_info[0].__name__ if record.exc_info else None,
-            'stacktrace': record.exc_text,
-        }
+        self._default = default or str
+        self._max_frames = max_frames
+        self._max_depth = max_depth
+        self._serializer = self.__get_serializer(serializer)
+        self._custom_serializer = callable(serializer)
+        self._projection = self.__compile_fields(enabled_fields or self.__BASIC_FIELDS)
+        self._uses_stacktrace = any(field == 'stacktrace' for field, _, _ in self._projection)
+        self._uses_location = any(field in LOCATION_FIELDS for field, _, _ in self._projection)
+        self._names = frozenset(name for _, name, _ in self._projection)
+        self._nested = any(field in self.__NESTED_FIELDS for field, _, _ in self._projection)
+        self._layout = self.__probe_layout()
+        self._fragment_key = object()
+
+    def __get_serializer(self, serializer):
+        """Resolve the serializer option to a function."""
+        if callable(serializer):
+            return serializer
+        if serializer == 'auto':
+            names = SERIALIZERS
+        elif serializer in SERIALIZERS:
+            names = (serializer, 'json')
+        else:
+            raise ValueError("Unknown JSON serializer: {!r}".format(serializer))
 
+        for name in names:
+            dumps = _make_serializer(name, self._indent, self._sort_keys, self._default)
+            if dumps is not None:
+                return dumps
+
+    def __probe_layout(self):
+        """Find out how the serializer lays out members of an object.
+
+        :return: Opening, separator and closing of members or ``None`` if encoded fragments of
+                 objects can't be spliced (in that case records are always serialized as a whole)
+        :rtype: tuple | None
+        """
+        if self._custom_serializer:
+            return None  # the order of keys is unknown
+        if self._sort_keys and not all(isinstance(name, six.string_types) for name in self._names):
+            return None
+        try:
+            probe = self.__obj2json({'a': 0, 'b': 0})
+            head = probe[:probe.index('"a"')]
+            member = probe[len(head):probe.index('0') + 1]
+            sep = probe[len(head) + len(member):probe.index('"b"')]
+            tail = probe[probe.rindex('0') + 1:]
+            members = [member.replace('"a"', '"{}"'.format(key)) for key in 'abc']
+            if self.__obj2json({'a': 0, 'b': 0, 'c': 0}) != head + sep.join(members) + tail:
+                return None
+        except Exception:
+            return None
+        return head, sep, tail
+
+    def __compile_fields(self, enabled_fields):
+        """Compile enabled fields into a projection plan.
+
+        The plan is a list of ``(field, output name, getter)`` tuples in the order of the record fields,
+        so only selected fields are computed for every record and they are emitted already renamed.
+        """
         if not isinstance(enabled_fields, list):
             enabled_fields = [str(enabled_fields)]
 
@@ -69,26 +154,143 @@ class JsonFormatter(BaseFormatter):
             else:
                 ef[item[0]] = item[1]
 
-        result = {}
-        for key, val in obj.items():
-            if key in ef:
-                result[ef[key]] = val
+        getters = {
+            'asctime': lambda record: self.formatTime(record, self.datefmt),
+            'levelname': lambda record: self._level_names[record.levelname],
+            'message': self.__format_message,
+            'exception': lambda record: record.exc_info[0].__name__ if record.exc_info else None,
+            'stacktrace': attrgetter('exc_text'),
+            'traceback': lambda record: traceback_cache.extract(record.exc_info, self._max_frames, self._max_depth)
+            if record.exc_info else None,
+        }
+
+        return [(field, ef[field], getters.get(field) or attrgetter(field))
+                for field in self.__RECORD_FIELDS if field in ef]
 
-        return result
+    @staticmethod
+    def __format_message(record):
+        """Return the log message joined with the prefix."""
+        return render_message(record)[1]
+
+    def __prepare_record(self, record):
+        """Prepare log record with enabled fields."""
+        return {name: getter(record) for _, name, getter in self._projection}
 
     def __obj2json(self, obj):
         """Serialize obj to a JSON formatted string.
 
         This is useful for pretty printing log records in the console.
         """
-        return json.dumps(obj, indent=self._indent, sort_keys=self._sort_keys)
+        s = self._serializer(obj)
+        return s.decode('utf-8') if isinstance(s, six.binary_type) else s
+
+    def __members(self, obj):
+        """Serialize obj and return its members without the enclosing braces."""
+        head, _, tail = self._layout
+        s = self.__obj2json(obj)
+        return s[len(head):len(s) - len(tail)]
+
+    def __encode_fields(self, fields):
+        """Encode bound custom fields into a fragment which is spliced into records.
+
+        Without sorting of keys the fragment is the members of the fields. With sorting it's a plan of
+        merging the members with the record fields: a list of encoded runs of custom fields (strings)
+        and runs of record fields (tuples with the first key of the next run of record fields,
+        which marks the end of the run in the encoded record fields, or ``None`` for the last run).
+
+        :return: Fragment and the names of record fields overridden by the custom fields,
+                 or ``None`` if the fields can't be spliced
+        :rtype: tuple | None
+        """
+        dropped = self._names.intersection(fields)
+        if not self._sort_keys:
+            # Overridden record fields keep their positions, so such records are serialized as a whole
+            return (self.__members(fields), dropped) if not dropped else None
+        if self._nested:
+            return None  # keys of nested objects would be taken for the keys of record fields
+
+        try:
+            keys = sorted(self._names - dropped)
+            runs = []
+            for key in sorted(fields):
+                while keys and keys[0] < key:
+                    if not runs or isinstance(runs[-1], dict):
+                        runs.append([])
+                    runs[-1].append(keys.pop(0))
+                if not runs or isinstance(runs[-1], list):
+                    runs.append({})
+                runs[-1][key] = fields[key]
+            if keys:
+                runs.append(keys)
+        except TypeError:
+            return None
+
+        _, sep, _ = self._layout
+        plan = []
+        for i, run in enumerate(runs):
+            if isinstance(run, dict):
+                plan.append(self.__members(run))
+                continue
+            following = [r for r in runs[i + 1:] if isinstance(r, list)]
+            if following:
+                member = self.__members({following[0][0]: 0})
+                plan.append((sep + member[:member.rindex('0')],))
+            else:
+                plan.append((None,))
+        return plan, dropped
+
+    def __splice(self, obj, fields):
+        """Serialize the record fields joined with the pre-encoded bound custom fields.
+
+        :rtype: str | None
+        """
+        encoded = fields.encoded
+        fragment = encoded.get(self._fragment_key)
+        if fragment is None:
+            # Fields of a context which is used for a single record aren't worth encoding
+            encoded.setdefault(self._fragment_key, _USED_ONCE)
+            return None
+        if fragment is _USED_ONCE:
+            fragment = encoded[self._fragment_key] = self.__encode_fields(fields) or False
+        if fragment is False:
+            return None
+
+        head, sep, tail = self._layout
+        fragment, dropped = fragment
+        if dropped:
+            obj = {k: v for k, v in obj.items() if k not in dropped}
+        if not self._sort_keys:
+            if not obj:
+                return head + fragment + tail
+            s = self.__obj2json(obj)
+            return s[:len(s) - len(tail)] + sep + fragment + tail
+
+        # Spliced record fields are scalars, so the encoded fields are split by their keys
+        body = self.__members(obj) if obj else ''
+        parts = []
+        pos = 0
+        for item in fragment:
+            if not isinstance(item, tuple):
+                parts.append(item)
+            elif item[0] is None:
+                parts.append(body[pos:])
+            else:
+                end = body.index(item[0], pos)
+                parts.append(body[pos:end])
+                pos = end + len(sep)
+        return head + sep.join(parts) + tail
 
     def format(self, record):
-        if record.exc_info and not record.exc_text:
+        if self._uses_stacktrace and record.exc_info and not record.exc_text:
             record.exc_text = self.formatException(record.exc_info)
 
-        obj = self.__compose_record(record)
-        if hasattr(record, 'extra_fields') and isinstance(record.extra_fields, dict):
-            obj.update(record.extra_fields)
+        obj = self.__prepare_record(record)
+        extra_fields = getattr(record, 'extra_fields', None)
+        if isinstance(extra_fields, dict) and extra_fields:
+            if type(extra_fields) is BoundFields and self._layout is not None:
+                s = self.__splice(obj, extra_fields)
+                if s is not None:
+                    return s
+            obj.update(extra_fields)
 
         return self.__obj2json(obj)
@@ -0,0 +1,355 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+import io
+import json
+import struct
+import sys
+
+import six
+
+from .base import BoundFields
+from .json_formatter import JsonFormatter
+
+_FRAME_HEADER = struct.Struct('>I')
+
+
+def _sized_header(size, fixed, fixed_limit, codes):
+    """Return the MessagePack header of a sized object: the fixed type with the size in its bits
+    or the first type of codes which fits the size."""
+    if fixed is not None and size < fixed_limit:
+        return struct.pack('B', fixed | size)
+    for code, fmt, limit in codes:
+        if size < limit:
+            return struct.pack(fmt, code, size)
+    raise ValueError("Object is too large for MessagePack: {} items".format(size))
+
+
+def _map_header(size):
+    """Return the MessagePack header of a map with the given number of entries."""
+    return _sized_header(size, 0x80, 16, ((0xde, '>BH', 0x10000), (0xdf, '>BI', 2 ** 32)))
+
+
+def _pack_int(obj, default, out):
+    if 0 <= obj < 0x80 or -32 <= obj < 0:
+        out.append(struct.pack('b' if obj < 0 else 'B', obj))
+    elif 0 <= obj < 2 ** 64:
+        out.append(_sized_header(obj, None, 0, ((0xcc, '>BB', 2 ** 8), (0xcd, '>BH', 2 ** 16),
+                                                (0xce, '>BI', 2 ** 32), (0xcf, '>BQ', 2 ** 64))))
+    elif -2 ** 63 <= obj < 0:
+        for code, fmt, limit in ((0xd0, '>Bb', 2 ** 7), (0xd1, '>Bh', 2 ** 15), (0xd2, '>Bi', 2 ** 31),
+                                 (0xd3, '>Bq', 2 ** 63)):
+            if obj >= -limit:
+                out.append(struct.pack(fmt, code, obj))
+                break
+    else:
+        _pack(default(obj), default, out)
+
+
+def _pack_float(obj, default, out):
+    out.append(struct.pack('>Bd', 0xcb, obj))
+
+
+def _pack_str(obj, default, out):
+    data = obj.encode('utf-8') if isinstance(obj, six.text_type) else obj
+    out.append(_sized_header(len(data), 0xa0, 32, ((0xd9, '>BB', 0x100), (0xda, '>BH', 0x10000),
+                                                   (0xdb, '>BI', 2 ** 32))))
+    out.append(data)
+
+
+def _pack_bin(obj, default, out):
+    out.append(_sized_header(len(obj), None, 0, ((0xc4, '>BB', 0x100), (0xc5, '>BH', 0x10000),
+                                                 (0xc6, '>BI', 2 ** 32))))
+    out.append(bytes(obj))
+
+
+def _pack_array(obj, default, out):
+    out.append(_sized_header(len(obj), 0x90, 16, ((0xdc, '>BH', 0x10000), (0xdd, '>BI', 2 ** 32))))
+    for item in obj:
+        _pack(item, default, out)
+
+
+def _pack_dict(obj, default, out):
+    out.append(_map_header(len(obj)))
+    for key, value in obj.items():
+        _pack(key, default, out)
+        _pack(value, default, out)
+
+
+_PACKERS = ((six.integer_types, _pack_int), (float, _pack_float), (six.string_types, _pack_str),
+            ((bytes, bytearray), _pack_bin), ((list, tuple), _pack_array), (dict, _pack_dict))
+
+
+def _pack(obj, default, out):
+    """Append MessagePack representation of obj to the list of chunks (used if msgpack isn't installed)."""
+    if obj is None:
+        out.append(b'\xc0')
+    elif obj is True or obj is False:
+        out.append(b'\xc3' if obj else b'\xc2')
+    else:
+        for types, pack in _PACKERS:
+            if isinstance(obj, types):
+                pack(obj, default, out)
+                return
+        _pack(default(obj), default, out)
+
+
+def _unpack(data, pos=0):
+    """Decode MessagePack object at the position of data (used if msgpack isn't installed).
+
+    :return: Object and the position after it
+    :rtype: tuple
+    """
+    code = six.indexbytes(data, pos)
+    pos += 1
+    if code < 0x80:
+        return code, pos
+    if code >= 0xe0:
+        return code - 0x100, pos
+    if code <= 0x8f or code in (0xde, 0xdf):
+        if code <= 0x8f:
+            size = code & 0x0f
+        else:
+            fmt = '>H' if code == 0xde else '>I'
+            size, = struct.unpack_from(fmt, data, pos)
+            pos += struct.calcsize(fmt)
+        obj = {}
+        for _ in range(size):
+            key, pos = _unpack(data, pos)
+            obj[key], pos = _unpack(data, pos)
+        return obj, pos
+    if code <= 0x9f or code in (0xdc, 0xdd):
+        if code <= 0x9f:
+            size = code & 0x0f
+        else:
+            fmt = '>H' if code == 0xdc else '>I'
+            size, = struct.unpack_from(fmt, data, pos)
+            pos += struct.calcsize(fmt)
+        obj = []
+        for _ in range(size):
+            item, pos = _unpack(data, pos)
+            obj.append(item)
+        return obj, pos
+    if code <= 0xbf or code in (0xd9, 0xda, 0xdb, 0xc4, 0xc5, 0xc6):
+        if code <= 0xbf:
+            size = code & 0x1f
+        else:
+            fmt = {0xd9: '>B', 0xda: '>H', 0xdb: '>I', 0xc4: '>B', 0xc5: '>H', 0xc6: '>I'}[code]
+            size, = struct.unpack_from(fmt, data, pos)
+            pos += struct.calcsize(fmt)
+        chunk = bytes(data[pos:pos + size])
+        return (chunk if code in (0xc4, 0xc5, 0xc6) else chunk.decode('utf-8')), pos + size
+    if code in (0xc0, 0xc2, 0xc3):
+        return {0xc0: None, 0xc2: False, 0xc3: True}[code], pos
+    fmt = {0xca: '>f', 0xcb: '>d', 0xcc: '>B', 0xcd: '>H', 0xce: '>I', 0xcf: '>Q',
+           0xd0: '>b', 0xd1: '>h', 0xd2: '>i', 0xd3: '>q'}.get(code)
+    if fmt is None:
+        raise ValueError("Unsupported MessagePack type: 0x{:02x}".format(code))
+    value, = struct.unpack_from(fmt, data, pos)
+    return value, pos + struct.calcsize(fmt)
+
+
+def _make_packer(default):
+    """Return a function which serializes obj to MessagePack bytes."""
+    try:
+        import msgpack
+        return msgpack.Packer(default=default, use_bin_type=True, autoreset=True).pack
+    except (ImportError, TypeError):
+        def pack(obj):
+            out = []
+            _pack(obj, default, out)
+            return b''.join(out)
+        return pack
+
+
+def _make_unpacker():
+    """Return a function which deserializes MessagePack bytes."""
+    try:
+        import msgpack
+        return lambda data: msgpack.unpackb(data, raw=False, strict_map_key=False)
+    except ImportError:
+        return lambda data: _unpack(data)[0]
+
+
+class MsgPackFormatter(JsonFormatter):
+
+    def __init__(self, datefmt=None, enabled_fields=None, default=None, max_frames=None, max_depth=None,
+                 max_names=1024):
+        """Initialize the formatter of records as length-prefixed MessagePack frames.
+
+        Records are formatted as bytes and should be written into a binary stream
+        (set ``terminator`` of stream handlers as ``b''``). Enabled fields, names of levels
+        and truncation of tracebacks are set up like in :class:`JsonFormatter`.
+
+        Names of fields are sent once per stream, in a dictionary frame which precedes the first record
+        using them, and records refer to them by index. Call :meth:`reset` when a new stream is started.
+        Use :class:`MsgPackDecoder` to read records back. The ``msgpack`` package is used if installed.
+
+        The formatter keeps the state of a single stream, so every handler needs its own formatter.
+        A dictionary frame is sent once even if the handler fails to write it, and records of the
+        stream are then decoded with indexes in place of the names, until :meth:`reset` is called.
+        Stream handlers of Python 2 append a newline to every record, so use PyLogrus handlers there.
+
+        :param max_names: Maximum number of names in the dictionary. Other names are sent in every record
+        :type max_names: int
+        """
+        super(MsgPackFormatter, self).__init__(datefmt=datefmt, enabled_fields=enabled_fields, default=default,
+                                               max_frames=max_frames, max_depth=max_depth)
+        self.max_names = max_names
+        self._pack = _make_packer(self._default)
+        self.reset()
+
+    def reset(self):
+        """Start a new stream: the dictionary of names is sent again with the next record."""
+        self._dictionary = {}
+        self._new_names = []
+        self._fragment_key = object()
+        self._indexed_projection = [(self._intern(name), getter) for _, name, getter in self._projection]
+
+    def _intern(self, name):
+        """Return the index of the name in the dictionary (or the name itself if it's not interned).
+
+        Integer keys of records are indexes, so other names are converted to strings like in JSON.
+        """
+        index = self._dictionary.get(name)
+        if index is None:
+            if not isinstance(name, six.string_types):
+                return self._intern(str(name))
+            if len(self._dictionary) >= self.max_names:
+                return name
+            index = self._dictionary[name] = len(self._dictionary)
+            self._new_names.append(name)
+        return index
+
+    def _pack_map(self, obj, fragment=None):
+        """Serialize the map joined with pre-encoded entries of another map.
+
+        :param fragment: Number and encoded entries of another map
+        :type fragment: tuple
+        """
+        data = self._pack(obj)
+        if fragment is None:
+            return data
+        size, entries = fragment
+        return _map_header(len(obj) + size) + data[len(_map_header(len(obj))):] + entries
+
+    def format(self, record):
+        if self._uses_stacktrace and record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+
+        obj = {index: getter(record) for index, getter in self._indexed_projection}
+        fragment = None
+        extra_fields = getattr(record, 'extra_fields', None)
+        if isinstance(extra_fields, dict) and extra_fields:
+            if type(extra_fields) is BoundFields:
+                # Entries of bound custom fields are encoded once
+                cached = extra_fields.encoded.get(self._fragment_key)
+                if cached is None:
+                    fields = {self._intern(k): v for k, v in extra_fields.items()}
+                    entries = self._pack(fields)[len(_map_header(len(fields))):]
+                    cached = extra_fields.encoded[self._fragment_key] = ((len(fields), entries), frozenset(fields))
+                fragment, keys = cached
+                if not keys.isdisjoint(obj):
+                    obj = {k: v for k, v in obj.items() if k not in keys}
+            else:
+                for key, value in extra_fields.items():
+                    obj[self._intern(key)] = value
+
+        payload = self._pack_map(obj, fragment)
+        data = _FRAME_HEADER.pack(len(payload)) + payload
+        if self._new_names:
+            dictionary = self._pack([len(self._dictionary) - len(self._new_names), self._new_names])
+            data = _FRAME_HEADER.pack(len(dictionary)) + dictionary + data
+            self._new_names = []
+        return data
+
+
+class MsgPackDecoder(object):
+
+    def __init__(self):
+        """Decoder of the stream of frames written by :class:`MsgPackFormatter`."""
+        self._names = []
+        self._buffer = b''
+        self._unpack = _make_unpacker()
+
+    def feed(self, data):
+        """Decode records of the next chunk of the stream.
+
+        :param data: Chunk of the stream (frames may be split between chunks)
+        :type data: bytes
+        :return: Decoded records
+        :rtype: list
+        """
+        buffer = self._buffer + data
+        records = []
+        pos = 0
+        while len(buffer) - pos >= _FRAME_HEADER.size:
+            size, = _FRAME_HEADER.unpack_from(buffer, pos)
+            end = pos + _FRAME_HEADER.size + size
+            if end > len(buffer):
+                break
+            record = self.decode(buffer[pos + _FRAME_HEADER.size:end])
+            if record is not None:
+                records.append(record)
+            pos = end
+        self._buffer = buffer[pos:]
+        return records
+
+    def decode(self, frame):
+        """Decode a single frame.
+
+        Indexes of names missing in the dictionary (e.g. if the frame of the dictionary was lost)
+        are kept as keys of the record.
+
+        :return: Record or ``None`` for a frame of the dictionary
+        :rtype: dict | None
+        """
+        obj = self._unpack(frame)
+        names = self._names
+        if isinstance(obj, list):
+            offset, new_names = obj
+            if offset > len(names):
+                names.extend([None] * (offset - len(names)))  # names of lost dictionary frames
+            names[offset:] = new_names
+            return None
+        size = len(names)
+        record = {}
+        for k, v in obj.items():
+            name = names[k] if isinstance(k, six.integer_types) and k < size else None
+            record[k if name is None else name] = v
+        return record
+
+
+def iter_records(stream, chunk_size=65536):
+    """Yield records from a binary stream written by :class:`MsgPackFormatter`.
+
+    :param stream: Binary stream
+    :type stream: file
+    :rtype: iterator
+    """
+    decoder = MsgPackDecoder()
+    while True:
+        data = stream.read(chunk_size)
+        if not data:
+            break
+        for record in decoder.feed(data):
+            yield record
+
+
+def main(argv=None):
+    """Convert a stream of MessagePack records into JSON lines."""
+    parser = argparse.ArgumentParser(description="Convert records written by MsgPackFormatter into JSON lines")
+    parser.add_argument('filename', nargs='?', help="file of records (standard input by default)")
+    args = parser.parse_args(argv)
+
+    stream = io.open(args.filename, 'rb') if args.filename else getattr(sys.stdin, 'buffer', sys.stdin)
+    try:
+        for record in iter_records(stream):
+            sys.stdout.write(json.dumps(record, default=str) + '\n')
+    finally:
+        if args.filename:
+            stream.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+
+import io
+import logging
+import multiprocessing
+import os
+import select
+import socket
+import struct
+import sys
+import threading
+import time
+
+import six
+
+_HEADER = struct.Struct('>I')
+
+
+def _socket_family(address):
+    return socket.AF_UNIX if isinstance(address, six.string_types) else socket.AF_INET
+
+
+class CollectorHandler(logging.Handler):
+
+    def __init__(self, address, retry_interval=1.0):
+        """Handler which ships formatted records to :class:`LogCollector`.
+
+        Every record is formatted in the worker process and sent as a length-prefixed frame, so records
+        of different processes are never interleaved. The connection is reestablished in forked processes.
+        Formatters with state of stream (like :class:`MsgPackFormatter`) aren't accepted, since the collector
+        merges streams of all processes.
+
+        :param address: Path of Unix socket or (host, port) tuple of the collector
+        :type address: str | tuple
+        :param retry_interval: Time (in seconds) before reconnecting after a failure.
+                               Records logged in the meantime are dropped
+        :type retry_interval: float
+        """
+        super(CollectorHandler, self).__init__()
+        self.address = address
+        self.retry_interval = retry_interval
+        self.dropped = 0
+        self._sock = None
+        self._pid = None
+        self._retry_at = 0
+
+    def _connect(self):
+        if time.time() < self._retry_at:
+            return False
+        sock = socket.socket(_socket_family(self.address), socket.SOCK_STREAM)
+        try:
+            sock.connect(self.address)
+        except socket.error:
+            sock.close()
+            self._retry_at = time.time() + self.retry_interval
+            return False
+        self._sock = sock
+        self._pid = os.getpid()
+        return True
+
+    def setFormatter(self, fmt):
+        if hasattr(fmt, 'reset'):
+            raise ValueError("{} can't write records of formatters with state of stream".format(type(self).__name__))
+        super(CollectorHandler, self).setFormatter(fmt)
+
+    def emit(self, record):
+        try:
+            data = self.format(record)
+            if isinstance(data, six.text_type):
+                data = data.encode('utf-8')
+        except Exception:
+            self.handleError(record)
+            return
+
+        if not self._write(data):
+            self._drop(record)
+
+    def _write(self, data):
+        """Send the frame to the collector.
+
+        :return: ``False`` if the collector is unavailable
+        :rtype: bool
+        """
+        if (self._sock is None or self._pid != os.getpid()) and not self._connect():
+            return False
+
+        try:
+            self._sock.sendall(_HEADER.pack(len(data)) + data)
+        except socket.error:
+            self._sock.close()
+            self._sock = None
+            self._retry_at = time.time() + self.retry_interval
+            return False
+        return True
+
+    def _drop(self, record):
+        self.dropped += 1
+
+    def close(self):
+        self.acquire()
+        try:
+            if self._sock is not None and self._pid == os.getpid():
+                self._sock.close()
+            self._sock = None
+        finally:
+            self.release()
+        super(CollectorHandler, self).close()
+
+
+class LogCollector(object):
+
+    def __init__(self, address, filename=None, stream=None, buffer_size=65536, flush_interval=0.5, backlog=128):
+        """Collector which writes records shipped by :class:`CollectorHandler` of many processes.
+
+        Records are written in order of arrival, joined into batches.
+
+        :param address: Path of Unix socket or (host, port) tuple to listen on
+        :type address: str | tuple
+        :param filename: Name of output file
+        :type filename: str
+        :param stream: Output stream, if ``filename`` isn't set (``sys.stderr`` by default)
+        :type stream: file
+        :param buffer_size: Maximum size of buffered records (in bytes)
+        :type buffer_size: int
+        :param flush_interval: Maximum time (in seconds) a record stays in the buffer
+        :type flush_interval: float
+        :param backlog: Maximum number of pending connections
+        :type backlog: int
+        """
+        self.address = address
+        self.filename = filename
+        self.stream = stream
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.backlog = backlog
+        self.terminator = '\n'
+        self._ready = multiprocessing.Event()
+        self._stopped = multiprocessing.Event()
+        self._runner = None
+
+    def _bind(self):
+        server = socket.socket(_socket_family(self.address), socket.SOCK_STREAM)
+        if server.family == socket.AF_UNIX:
+            if os.path.exists(self.address):
+                os.unlink(self.address)
+        else:
+            server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind(self.address)
+        server.listen(self.backlog)
+        return server
+
+    def _open(self):
+        if self.filename:
+            return io.open(self.filename, 'a', encoding='utf-8')
+        return self.stream or sys.stderr
+
+    @staticmethod
+    def _split(data):
+        """Split received data into complete frames.
+
+        :return: List of frames and the rest of data
+        :rtype: tuple
+        """
+        frames = []
+        pos = 0
+        while len(data) - pos >= _HEADER.size:
+            size, = _HEADER.unpack_from(data, pos)
+            end = pos + _HEADER.size + size
+            if end > len(data):
+                break
+            frames.append(bytes(data[pos + _HEADER.size:end]))
+            pos = end
+        return frames, data[pos:]
+
+    def serve_forever(self):
+        """Receive and write records until :meth:`stop` is called."""
+        server = self._bind()
+        output = self._open()
+        clients = {}
+        lines = []
+        buffered = 0
+        flushed_at = time.time()
+        self._ready.set()
+
+        def write():
+            output.write(u''.join(lines))
+            output.flush()
+            del lines[:]
+
+        def receive(readable):
+            received = 0
+            for sock in readable:
+                if sock is server:
+                    conn, _ = server.accept()
+                    clients[conn] = bytearray()
+                    continue
+                data = sock.recv(65536)
+                if not data:
+                    sock.close()
+                    del clients[sock]
+                    continue
+                frames, clients[sock] = self._split(clients[sock] + data)
+                for frame in frames:
+                    lines.append(frame.decode('utf-8', 'replace') + self.terminator)
+                    received += len(frame)
+            return received
+
+        try:
+            while not self._stopped.is_set():
+                readable, _, _ = select.select([server] + list(clients), [], [], self.flush_interval)
+                buffered += receive(readable)
+                if lines and (buffered >= self.buffer_size or time.time() - flushed_at >= self.flush_interval):
+                    write()
+                    buffered = 0
+                    flushed_at = time.time()
+
+            # Receive the records which have been sent before stopping
+            while True:
+                readable, _, _ = select.select([server] + list(clients), [], [], 0)
+                if not readable:
+                    break
+                receive(readable)
+        finally:
+            for sock in clients:
+                sock.close()
+            server.close()
+            if lines:
+                write()
+            if self.filename:
+                output.close()
+            if _socket_family(self.address) == socket.AF_UNIX and os.path.exists(self.address):
+                os.unlink(self.address)
+
+    def start(self, process=True, timeout=None):
+        """Run the collector in a separate process (or a thread) and wait until it accepts connections.
+
+        :param process: If ``True``, the collector runs in a separate process, otherwise in a thread
+        :type process: bool
+        :param timeout: Maximum time (in seconds) to wait for the collector
+        :type timeout: float
+        """
+        if process:
+            self._runner = multiprocessing.Process(target=self.serve_forever, name='pylogrus-collector')
+        else:
+            self._runner = threading.Thread(target=self.serve_forever, name='pylogrus-collector')
+        self._runner.daemon = True
+        self._runner.start()
+        self._ready.wait(timeout)
+
+    def stop(self, timeout=None):
+        """Stop the collector after all received records are written."""
+        self._stopped.set()
+        if self._runner is not None:
+            self._runner.join(timeout)
+            self._runner = None
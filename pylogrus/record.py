@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+from functools import partial
+import logging
+import os
+import sys
+import threading
+import time
+
+from six.moves import _thread
+
+try:
+    from collections.abc import Mapping
+except ImportError:  # PY2
+    from collections import Mapping
+
+
+class PyLogrusRecord(logging.LogRecord):
+
+    OPTIONAL_FIELDS = ('filename', 'module', 'threadName', 'processName', 'taskName')
+
+    def __init__(self, name, level, pathname, lineno, msg, args, exc_info, func=None, sinfo=None, fields=None,
+                 **kwargs):
+        """Log record which computes only the optional attributes read by formatters.
+
+        Custom fields and prefix of message are kept in the attributes of the record like in records of
+        the ``logging`` module, so handlers which ship ``record.__dict__`` keep them. Optional attributes
+        (``filename``, ``module``, ``threadName``, ``processName`` and ``taskName``) are computed only
+        if they are in ``fields``, otherwise they are set as ``None``.
+
+        :param fields: Names of optional attributes read by formatters (all of them by default)
+        :type fields: frozenset | None
+        """
+        ct = time.time()
+        self.name = name
+        self.msg = msg
+        if args and len(args) == 1 and isinstance(args[0], Mapping) and args[0]:
+            args = args[0]
+        self.args = args
+        self.levelname = logging.getLevelName(level)
+        self.levelno = level
+        self.pathname = pathname
+        self.filename = None
+        self.module = None
+        if fields is None or 'filename' in fields or 'module' in fields:
+            try:
+                self.filename = os.path.basename(pathname)
+                self.module = os.path.splitext(self.filename)[0]
+            except (TypeError, ValueError, AttributeError):
+                self.filename = pathname
+                self.module = "Unknown module"
+        self.exc_info = exc_info
+        self.exc_text = None
+        self.stack_info = sinfo
+        self.lineno = lineno
+        self.funcName = func
+        self.created = ct
+        self.msecs = int((ct - int(ct)) * 1000) + 0.0
+        start = logging._startTime
+        self.relativeCreated = (ct - (start / 1e9 if isinstance(start, int) else start)) * 1000
+
+        self.thread = _thread.get_ident() if logging.logThreads else None
+        self.threadName = None
+        if logging.logThreads and (fields is None or 'threadName' in fields):
+            self.threadName = threading.current_thread().name
+
+        self.processName = None
+        if getattr(logging, 'logMultiprocessing', True) and (fields is None or 'processName' in fields):
+            self.processName = 'MainProcess'
+            mp = sys.modules.get('multiprocessing')
+            if mp is not None:
+                try:
+                    self.processName = mp.current_process().name
+                except Exception:
+                    pass
+        self.process = os.getpid() if logging.logProcesses and hasattr(os, 'getpid') else None
+
+        if sys.version_info >= (3, 12):  # Python version >= 3.12
+            self.taskName = None
+            if getattr(logging, 'logAsyncioTasks', True) and (fields is None or 'taskName' in fields):
+                asyncio = sys.modules.get('asyncio')
+                if asyncio:
+                    try:
+                        self.taskName = asyncio.current_task().get_name()
+                    except Exception:
+                        pass
+
+
+def record_factory(fields=None):
+    """Return a factory of :class:`PyLogrusRecord` which computes only the given optional attributes.
+
+    The factory can be set as ``record_factory`` of :class:`PyLogrus` class or instance.
+
+    :param fields: Names of record attributes read by formatters, e.g. ``enabled_fields`` of JsonFormatter.
+                   A field can be represented by string (field name) or tuple ((field name, new name)).
+                   If ``None``, all attributes are computed
+    :type fields: list | None
+    :rtype: callable
+    """
+    if fields is not None:
+        fields = frozenset(field[0] if isinstance(field, tuple) else field for field in fields)
+    return partial(PyLogrusRecord, fields=fields)
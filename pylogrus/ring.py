@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+import io
+import logging
+import mmap
+import os
+import struct
+import sys
+import time
+import zlib
+
+import six
+
+_MAGIC = b'PYLOGRUS'
+_VERSION = 1
+_HEADER_SIZE = 64
+# Magic, version, size of header, capacity of data area
+_HEADER = struct.Struct('<8sIIQ')
+# Logical offsets of the oldest record (tail) and the end of the last record (head), sequence number
+_POSITIONS = struct.Struct('<QQQ')
+# Size of record, sequence number and CRC32 of both of them and the record
+_FRAME_PREFIX = struct.Struct('<IQ')
+_FRAME_CRC = struct.Struct('<I')
+_FRAME_SIZE = _FRAME_PREFIX.size + _FRAME_CRC.size
+
+
+def _crc(prefix, payload):
+    return zlib.crc32(payload, zlib.crc32(prefix)) & 0xffffffff
+
+
+def _read(mm, capacity, pos, size):
+    """Read bytes at the logical offset of the ring."""
+    start = _HEADER_SIZE + pos % capacity
+    end = start + size
+    limit = _HEADER_SIZE + capacity
+    if end <= limit:
+        return mm[start:end]
+    return mm[start:limit] + mm[_HEADER_SIZE:_HEADER_SIZE + end - limit]
+
+
+class RingHandler(logging.Handler):
+
+    def __init__(self, filename, capacity=16 * 1024 * 1024):
+        """Handler which writes formatted records into a fixed-size memory-mapped ring file.
+
+        Writing a record is a copy into the mapped memory without system calls. The newest records
+        overwrite the oldest ones and the last ``capacity`` bytes of records survive a crash of
+        the process. Records are read back by :func:`read_ring`. The file must be written by a single
+        process. An existing ring file with the same capacity is continued. Formatters with state
+        of stream (like :class:`MsgPackFormatter`) aren't accepted, since their dictionary frames are
+        overwritten like other records.
+
+        :param filename: Name of ring file
+        :type filename: str
+        :param capacity: Size of the data area of the file (in bytes)
+        :type capacity: int
+        """
+        super(RingHandler, self).__init__()
+        self.filename = os.path.abspath(filename)
+        self.capacity = int(capacity)
+        self.dropped = 0
+        self._fd = os.open(self.filename, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            self._mm = self._map()
+        except Exception:
+            os.close(self._fd)
+            raise
+        self._tail, self._head, self._seq = _POSITIONS.unpack_from(self._mm, _HEADER.size)
+
+    def _map(self):
+        """Map the ring file, which is initialized unless it's a ring with the same capacity."""
+        size = _HEADER_SIZE + self.capacity
+        valid = False
+        if os.fstat(self._fd).st_size == size:
+            with io.open(self._fd, 'rb', closefd=False) as f:
+                header = f.read(_HEADER.size)
+            valid = header == _HEADER.pack(_MAGIC, _VERSION, _HEADER_SIZE, self.capacity)
+
+        if not valid:
+            os.ftruncate(self._fd, 0)
+            os.ftruncate(self._fd, size)
+        mm = mmap.mmap(self._fd, size)
+        if not valid:
+            _HEADER.pack_into(mm, 0, _MAGIC, _VERSION, _HEADER_SIZE, self.capacity)
+            _POSITIONS.pack_into(mm, _HEADER.size, 0, 0, 0)
+        return mm
+
+    def _copy(self, pos, data):
+        """Copy bytes to the logical offset of the ring."""
+        start = _HEADER_SIZE + pos % self.capacity
+        limit = _HEADER_SIZE + self.capacity
+        split = limit - start
+        if len(data) <= split:
+            self._mm[start:start + len(data)] = data
+        else:
+            self._mm[start:limit] = data[:split]
+            self._mm[_HEADER_SIZE:_HEADER_SIZE + len(data) - split] = data[split:]
+
+    def setFormatter(self, fmt):
+        if hasattr(fmt, 'reset'):
+            raise ValueError("{} can't write records of formatters with state of stream".format(type(self).__name__))
+        super(RingHandler, self).setFormatter(fmt)
+
+    def emit(self, record):
+        try:
+            payload = self.format(record)
+            if isinstance(payload, six.text_type):
+                payload = payload.encode('utf-8')
+            if not self._write(payload):
+                self._drop(record)
+        except Exception:
+            self.handleError(record)
+
+    def _drop(self, record):
+        self.dropped += 1
+
+    def _write(self, payload):
+        """Copy the record into the ring.
+
+        :return: ``False`` if the record is larger than the ring or the handler is closed
+        :rtype: bool
+        """
+        size = _FRAME_SIZE + len(payload)
+        if size > self.capacity or self._mm is None:
+            return False
+
+        # Free space by forgetting the oldest records. The new tail is committed before
+        # the records are overwritten, so a reader never starts at an overwritten record.
+        tail = self._tail
+        while self._head + size - tail > self.capacity:
+            length, _ = _FRAME_PREFIX.unpack(_read(self._mm, self.capacity, tail, _FRAME_PREFIX.size))
+            tail += _FRAME_SIZE + length
+        if tail != self._tail:
+            self._tail = tail
+            _POSITIONS.pack_into(self._mm, _HEADER.size, tail, self._head, self._seq)
+
+        prefix = _FRAME_PREFIX.pack(len(payload), self._seq)
+        self._copy(self._head, prefix + _FRAME_CRC.pack(_crc(prefix, payload)) + payload)
+        self._head += size
+        self._seq += 1
+        _POSITIONS.pack_into(self._mm, _HEADER.size, self._tail, self._head, self._seq)
+        return True
+
+    def flush(self):
+        """Write the mapped memory to the disk.
+
+        It isn't needed to keep records after a crash of the process, only after a crash of the system.
+        """
+        self.acquire()
+        try:
+            if self._mm is not None:
+                self._mm.flush()
+        finally:
+            self.release()
+
+    def close(self):
+        self.acquire()
+        try:
+            if self._mm is not None:
+                self._mm.flush()
+                self._mm.close()
+                self._mm = None
+                os.close(self._fd)
+        finally:
+            self.release()
+        super(RingHandler, self).close()
+
+
+def _read_frame(mm, capacity, pos, head):
+    """Read and check the record at the logical offset of the ring.
+
+    :return: Record and size of its frame, or ``None`` if there's no valid record at the offset
+    :rtype: tuple | None
+    """
+    if head - pos < _FRAME_SIZE:
+        return None
+    frame = _read(mm, capacity, pos, _FRAME_SIZE)
+    length, _ = _FRAME_PREFIX.unpack_from(frame)
+    if _FRAME_SIZE + length > head - pos:
+        return None
+    payload = _read(mm, capacity, pos + _FRAME_SIZE, length)
+    crc, = _FRAME_CRC.unpack_from(frame, _FRAME_PREFIX.size)
+    if crc != _crc(frame[:_FRAME_PREFIX.size], payload):
+        return None
+    return payload, _FRAME_SIZE + length
+
+
+def read_ring(filename, follow=False, interval=0.5):
+    """Yield records of the ring file written by :class:`RingHandler` from the oldest to the newest one.
+
+    Torn records (e.g. the record being overwritten while the ring is read) are skipped.
+
+    :param filename: Name of ring file
+    :type filename: str
+    :param follow: If ``True``, wait for new records like ``tail -f``
+    :type follow: bool
+    :param interval: Time (in seconds) between checks for new records
+    :type interval: float
+    :return: Iterator over formatted records
+    :rtype: iterator
+    """
+    with io.open(filename, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        magic, version, header_size, capacity = _HEADER.unpack_from(mm)
+        if magic != _MAGIC or version != _VERSION or header_size != _HEADER_SIZE:
+            raise ValueError("{} isn't a ring file".format(filename))
+
+        pos = 0
+        while True:
+            tail, head, _ = _POSITIONS.unpack_from(mm, _HEADER.size)
+            pos = max(pos, tail)
+            while pos < head:
+                frame = _read_frame(mm, capacity, pos, head)
+                tail, _, _ = _POSITIONS.unpack_from(mm, _HEADER.size)
+                if pos < tail:  # the record has been overwritten while reading
+                    pos = tail
+                    continue
+                if frame is None:  # search for the next valid record
+                    pos += 1
+                    continue
+                payload, size = frame
+                pos += size
+                yield payload.decode('utf-8', 'replace')
+
+            if not follow:
+                break
+            time.sleep(interval)
+    finally:
+        mm.close()
+
+
+def main(argv=None):
+    """Print records of the ring file."""
+    parser = argparse.ArgumentParser(description="Print records of a PyLogrus ring file")
+    parser.add_argument('filename', help="ring file written by RingHandler")
+    parser.add_argument('-f', '--follow', action='store_true', help="wait for new records")
+    args = parser.parse_args(argv)
+
+    try:
+        for line in read_ring(args.filename, follow=args.follow):
+            sys.stdout.write(line + '\n')
+            if args.follow:
+                sys.stdout.flush()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
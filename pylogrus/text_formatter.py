@@ -2,11 +2,12 @@
 
 import copy
 import re
+import string
 import sys
 
 import six
 
-from .base import BaseFormatter
+from .base import BaseFormatter, render_message
 
 # Customize the console colors
 CL_TXTBLK = '\x1b[0;30m'  # Black - Regular
@@ -52,6 +53,78 @@ CL_BAKWHT = '\x1b[47m'    # White
 CL_TXTRST = '\x1b[0m'     # Text Reset
 
 
+_PERCENT_FIELD = re.compile(r'%(?:\((\w+)\)([#0+ -]*\d*(?:\.\d+)?[diouxXeEfFgGcrsa])|%)')
+_IDENTIFIER = re.compile(r'\w+')
+
+
+def _percent_converter(spec):
+    """Return a function which renders a value with the %-style conversion specifier."""
+    if spec == 's' and six.PY3:
+        return str
+    spec = '%' + spec
+    return lambda value: spec % (value,)
+
+
+def _format_converter(spec):
+    """Return a function which renders a value with the :func:`format` specifier."""
+    return lambda value: format(value, spec)
+
+
+def _parse_format(fmt, style):
+    """Split the format string into literal text and replacement fields.
+
+    :return: List of (literal text, field name, converter of field value) tuples.
+             The field name of the last tuple is ``None``
+    :rtype: list
+    """
+    segments = []
+    literal = []
+    if style == '{':
+        for text, field, spec, conversion in string.Formatter().parse(fmt):
+            literal.append(text)
+            if field is None:
+                continue
+            name = _IDENTIFIER.match(field)
+            if name is None:
+                raise ValueError("Invalid field in format string: {!r}".format(field))
+            name = name.group()
+            if field == name and not conversion:
+                converter = _format_converter(spec)
+            else:
+                converter = ('{0' + field[len(name):] + ('!' + conversion if conversion else '') +
+                             (':' + spec if spec else '') + '}').format
+            segments.append((''.join(literal), name, converter))
+            literal = []
+    elif style == '$':
+        pos = 0
+        for match in string.Template.pattern.finditer(fmt):
+            literal.append(fmt[pos:match.start()])
+            pos = match.end()
+            if match.group('escaped') is not None:
+                literal.append('$')
+                continue
+            name = match.group('named') or match.group('braced')
+            if name is None:
+                raise ValueError("Invalid placeholder in format string: {!r}".format(fmt[match.start():]))
+            segments.append((''.join(literal), name, _percent_converter('s')))
+            literal = []
+        literal.append(fmt[pos:])
+    else:
+        pos = 0
+        for match in _PERCENT_FIELD.finditer(fmt):
+            literal.append(fmt[pos:match.start()])
+            pos = match.end()
+            name, spec = match.groups()
+            if name is None:
+                literal.append('%')
+                continue
+            segments.append((''.join(literal), name, _percent_converter(spec)))
+            literal = []
+        literal.append(fmt[pos:])
+    segments.append((''.join(literal), None, None))
+    return segments
+
+
 class TextFormatter(BaseFormatter):
 
     __BASE_FORMAT = "{cl_dtm}[{cl_rst}%(asctime)s{cl_dtm}]{cl_rst} %(levelname)8s %(message)s"
@@ -89,18 +162,11 @@ class TextFormatter(BaseFormatter):
 
         basefmt = fmt or self.__BASE_FORMAT.format(cl_dtm=self._color[self._colorize].get('asctime', ''),
                                                    cl_rst=self._color_reset)
-        if self._colorize:
-            p = re.compile(r'(?<=%\(levelname\))(-?\d*)(?=(?:\.\d+)?s)')
-            res = p.search(basefmt)
-            if res is not None:
-                ln_color = max([len(i) for i in self._color[True]
-                                if i in ['debug', 'info', 'warning', 'error', 'critical']])
-                ln_color += len(self._color_reset) - 1
-                ln = int(res.group(1) or 0)
-                ln = ln + ln_color if ln > 0 else ln - ln_color
-                basefmt = p.sub(str(ln), basefmt, re.VERBOSE)
 
         super(TextFormatter, self).__init__(fmt=basefmt, datefmt=datefmt, style=style)
+        self._uses_time = self.usesTime()
+        self._segments = _parse_format(self._fmt, style)
+        self._compile_colors()
 
     @property
     def color(self):
@@ -117,50 +183,110 @@ class TextFormatter(BaseFormatter):
         for key in self._color[True]:
             if key in colors:
                 self._color[True][key] = colors[key]
+        self._compile_colors()
+
+    def override_level_names(self, mapping):
+        super(TextFormatter, self).override_level_names(mapping)
+        self._compile_colors()
+
+    def _compile_colors(self):
+        """Precompute color wrappers of message elements and recompile the format string."""
+        color = self._color[self._colorize]
+        reset = self._color_reset
+        self._cl_pfx = color.get('prefix', '')
+        self._cl_fld = '; ' + color.get('field', '')
+        self._cl_val = reset + '=' + color.get('value', '')
+        self._compile_template()
+
+    def _compile_template(self):
+        """Compile the format string into a render function.
+
+        Literal text, colors and padding of level names are baked in, and only the record attributes
+        referenced by the format string are read. Padding applies to level names without color codes.
+        """
+        template = []
+        getters = []
+        for literal, field, converter in self._segments:
+            template.append(literal.replace('%', '%%'))
+            if field is not None:
+                template.append('%s')
+                getters.append(self._make_getter(field, converter))
+        template = ''.join(template)
+        getters = tuple(getters)
+
+        def render(record, message, asctime):
+            return template % tuple([getter(record, message, asctime) for getter in getters])
 
-    def format(self, original_record):
-        record = copy.copy(original_record)
-        message = record.getMessage()
+        self._render = render
+
+    def _make_getter(self, field, converter):
+        """Return a function which renders the field of the format string.
+
+        :param field: Name of the field
+        :type field: str
+        :param converter: Function which renders the value of the field
+        :type converter: callable
+        :rtype: callable
+        """
+        color = self._color[self._colorize]
+        reset = self._color_reset
+
+        if field == 'message':
+            if converter is str:
+                return lambda record, message, asctime: message
+            return lambda record, message, asctime: converter(message)
+
+        if field == 'asctime':
+            cl_dtm = color.get('asctime', '')
+            return lambda record, message, asctime: cl_dtm + converter(asctime) + reset
+
+        if field == 'levelname':
+            def colorize(level, name):
+                # Padding stays outside of color codes
+                text = converter(name)
+                core = text.strip(' ')
+                start = text.index(core)
+                return text[:start] + color.get(level.lower(), '') + core + reset + text[start + len(core):]
+
+            levels = {level: colorize(level, name) for level, name in self._level_names.items()}
+
+            def get_level(record, message, asctime):
+                try:
+                    return levels[record.levelname]
+                except KeyError:
+                    return colorize(record.levelname, record.levelname)
+
+            return get_level
+
+        def get_attribute(record, message, asctime):
+            try:
+                value = getattr(record, field)
+            except AttributeError:
+                raise KeyError(field)
+            return converter(value)
+
+        return get_attribute
+
+    def format(self, record):
+        parts = []
         if hasattr(record, 'prefix'):
-            message = "{cl_pfx}{prefix}{cl_rst}{message}".format(
-                cl_pfx=self._color[self._colorize].get('prefix', ''),
-                cl_rst=self._color_reset,
-                prefix=(str(record.prefix) + ' ') if record.prefix else '',
-                message=message
-            )
+            parts += [self._cl_pfx, (str(record.prefix) + ' ') if record.prefix else '', self._color_reset]
+        parts.append(render_message(record)[0])
         if hasattr(record, 'extra_fields') and isinstance(record.extra_fields, dict):
             for k, v in sorted(record.extra_fields.items()):
-                message += "; {cl_fld}{field}{cl_rst}={cl_val}{value}{cl_rst}".format(
-                    cl_fld=self._color[self._colorize].get('field', ''),
-                    cl_val=self._color[self._colorize].get('value', ''),
-                    cl_rst=self._color_reset,
-                    field=k,
-                    value=v
-                )
-        record.message = message
-
-        if self.usesTime():
-            record.asctime = "{cl_dtm}{asctime}{cl_rst}".format(
-                cl_dtm=self._color[self._colorize].get('asctime', ''),
-                cl_rst=self._color_reset,
-                asctime=self.formatTime(record, self.datefmt)
-            )
-
-        record.levelname = "{cl_lvl}{level}{cl_rst}".format(
-            cl_lvl=self._color[self._colorize].get(record.levelname.lower(), ''),
-            cl_rst=self._color_reset,
-            level=self._level_names[record.levelname]
-        )
-
-        return (self._format_py2, self._format_py3)[six.PY3](record)
-
-    def _format_py2(self, record):
+                parts += [self._cl_fld, k, self._cl_val, str(v), self._color_reset]
+
+        asctime = self.formatTime(record, self.datefmt) if self._uses_time else None
+        return (self._format_py2, self._format_py3)[six.PY3](record, ''.join(parts), asctime)
+
+    def _format_py2(self, record, message, asctime):
         try:
-            s = self._fmt % record.__dict__
+            s = self._render(record, message, asctime)
         except UnicodeDecodeError as e:
             try:
-                record.name = record.name.decode('utf-8')
-                s = self._fmt % record.__dict__
+                named = copy.copy(record)
+                named.name = record.name.decode('utf-8')
+                s = self._render(named, message, asctime)
             except UnicodeDecodeError:
                 raise e
         if record.exc_info:
@@ -176,8 +302,8 @@ class TextFormatter(BaseFormatter):
 
         return s
 
-    def _format_py3(self, record):
-        s = self.formatMessage(record)
+    def _format_py3(self, record, message, asctime):
+        s = self._render(record, message, asctime)
 
         if record.exc_info and not record.exc_text:
             record.exc_text = self.formatException(record.exc_info)
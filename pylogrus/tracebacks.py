@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+
+import collections
+import threading
+import traceback
+
+import six
+from six.moves import builtins
+
+_CAUSE_MESSAGE = getattr(traceback, '_cause_message',
+                         "\nThe above exception was the direct cause of the following exception:\n\n")
+_CONTEXT_MESSAGE = getattr(traceback, '_context_message',
+                           "\nDuring handling of the above exception, another exception occurred:\n\n")
+_EXCEPTION_GROUP = getattr(builtins, 'BaseExceptionGroup', None)
+
+
+def _signature(tb):
+    """Return the code location signature of the traceback: code objects and instructions of its frames."""
+    frames = []
+    while tb is not None:
+        frames.append((tb.tb_frame.f_code, tb.tb_lasti))
+        tb = tb.tb_next
+    return tuple(frames)
+
+
+def _chain(value):
+    """Return the chain of exceptions (the given one first) with the messages which join them.
+
+    The chain is built like in the ``traceback`` module: the cause has priority over the context,
+    and the context is skipped if it's suppressed. Every exception appears once. Exceptions aren't
+    chained on Python 2.
+    """
+    if six.PY2:
+        return [(value, None)]
+    chain = []
+    seen = set()
+    while value is not None:
+        seen.add(id(value))
+        cause = getattr(value, '__cause__', None)
+        context = getattr(value, '__context__', None)
+        if cause is not None and id(cause) not in seen:
+            chain.append((value, _CAUSE_MESSAGE))
+            value = cause
+        elif context is not None and not getattr(value, '__suppress_context__', False) and id(context) not in seen:
+            chain.append((value, _CONTEXT_MESSAGE))
+            value = context
+        else:
+            chain.append((value, None))
+            value = None
+    return chain
+
+
+class TracebackCache(object):
+
+    def __init__(self, maxsize=256):
+        """LRU cache of rendered tracebacks shared by formatters.
+
+        Tracebacks are keyed on the type of exception and the code location signature of their frames,
+        so the stack of exceptions raised repeatedly at the same place (e.g. in retry loops) is extracted
+        and formatted once. Messages of exceptions are formatted for every record.
+
+        :param maxsize: Maximum number of cached tracebacks (0 disables caching)
+        :type maxsize: int
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def clear(self):
+        """Forget cached tracebacks."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def get(self, etype, tb):
+        """Return the rendered stack of the traceback.
+
+        :return: Formatted stack and frames as (filename, lineno, function, line) tuples
+        :rtype: tuple
+        """
+        key = (etype, _signature(tb))
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._entries[key] = entry
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        summary = traceback.extract_tb(tb)
+        entry = (''.join(traceback.format_list(summary)), tuple(tuple(frame)[:4] for frame in summary))
+        if self.maxsize > 0:
+            with self._lock:
+                self._entries[key] = entry
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return entry
+
+    def format_exception(self, ei):
+        """Format the exception like :func:`traceback.format_exception` with cached stacks.
+
+        :param ei: Exception info (the result of ``sys.exc_info()``)
+        :type ei: tuple
+        :return: Formatted exception or ``None`` if the exception can't be formatted from the cache
+                 (exception groups)
+        :rtype: str | None
+        """
+        etype, value, tb = ei
+        if value is None:
+            return ''.join(traceback.format_exception_only(etype, value))
+
+        parts = []
+        for exc, message in reversed(_chain(value)):
+            if _EXCEPTION_GROUP is not None and isinstance(exc, _EXCEPTION_GROUP):
+                return None
+            if message:
+                parts.append(message)
+            exc_tb = tb if exc is value else getattr(exc, '__traceback__', None)
+            if exc_tb is not None:
+                parts.append('Traceback (most recent call last):\n')
+                parts.append(self.get(type(exc), exc_tb)[0])
+            parts.extend(traceback.format_exception_only(type(exc), exc))
+        return ''.join(parts)
+
+    def extract(self, ei, max_frames=None, max_depth=None):
+        """Return the structured traceback of the exception.
+
+        :param ei: Exception info (the result of ``sys.exc_info()``)
+        :type ei: tuple
+        :param max_frames: Maximum number of frames of every exception (the innermost ones are kept)
+        :type max_frames: int
+        :param max_depth: Maximum number of chained exceptions (the logged exception first)
+        :type max_depth: int
+        :return: Exceptions of the chain as dicts with ``exception``, ``message`` and ``frames`` keys
+        :rtype: list
+        """
+        etype, value, tb = ei
+        chain = _chain(value) if value is not None else [(value, None)]
+        result = []
+        for exc, _ in chain[:max_depth]:
+            exc_tb = tb if exc is value else getattr(exc, '__traceback__', None)
+            frames = self.get(type(exc), exc_tb)[1] if exc_tb is not None else ()
+            if max_frames is not None:
+                frames = frames[-max_frames:] if max_frames > 0 else ()
+            result.append({
+                'exception': (etype if exc is value else type(exc)).__name__,
+                'message': six.text_type(exc) if exc is not None else '',
+                'frames': [{'filename': filename, 'lineno': lineno, 'function': function, 'line': line}
+                           for filename, lineno, function, line in frames],
+            })
+        return result
+
+
+#: Cache of tracebacks shared by PyLogrus formatters
+traceback_cache = TracebackCache()
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""Tests of the asyncio API, imported by test_aio on Python 3.8+."""
+
+import unittest
+
+import asyncio
+import io
+import json
+import logging
+
+from pylogrus import PyLogrus, JsonFormatter, AsyncioHandler, bind_fields, reset_fields
+
+
+class TestAsyncioHandler(unittest.TestCase):
+
+    def get_logger(self, handler):
+        logging.setLoggerClass(PyLogrus)
+
+        logger = logging.getLogger(__name__)  # type: PyLogrus
+        logger.setLevel(logging.DEBUG)
+        logger.handlers = []
+
+        handler.setLevel(logging.DEBUG)
+        handler.setFormatter(JsonFormatter())
+        logger.addHandler(handler)
+
+        return logger
+
+    def read_records(self, stream):
+        return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+    def test_write_records(self):
+        stream = io.StringIO()
+        handler = AsyncioHandler(stream)
+        log = self.get_logger(handler)
+
+        async def main():
+            log_ctx = log.withFields({'context': 1}).withPrefix("[API]")
+            for i in range(10):
+                log_ctx.withFields({'num': i}).info("test message")
+            await handler.aflush()
+            self.assertEqual(len(self.read_records(stream)), 10)
+            log.info("last message")
+            await handler.aclose()
+
+        asyncio.run(main())
+        records = self.read_records(stream)
+        self.assertEqual([r['num'] for r in records[:-1]], list(range(10)))
+        self.assertEqual(records[0]['message'], "[API] test message")
+        self.assertEqual(records[-1]['message'], "last message")
+
+    def test_write_without_loop(self):
+        stream = io.StringIO()
+        log = self.get_logger(AsyncioHandler(stream))
+        log.info("test message")
+        self.assertEqual(self.read_records(stream)[0]['message'], "test message")
+
+    def test_context_fields(self):
+        stream = io.StringIO()
+        handler = AsyncioHandler(stream)
+        log = self.get_logger(handler)
+
+        async def request(request_id):
+            bind_fields({'Request_ID': request_id})
+            await asyncio.sleep(0)
+            await asyncio.create_task(subtask())
+
+        async def subtask():
+            log.withFields({'user': 'John Doe'}).info("test message")
+
+        async def main():
+            await asyncio.gather(request(1), request(2))
+            token = bind_fields({'request_id': 3})
+            reset_fields(token)
+            log.info("without context")
+            await handler.aclose()
+
+        asyncio.run(main())
+        records = self.read_records(stream)
+        self.assertEqual(sorted(r['request_id'] for r in records[:2]), [1, 2])
+        self.assertEqual([r['user'] for r in records[:2]], ['John Doe', 'John Doe'])
+        self.assertNotIn('request_id', records[2])
@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+
+import sys
+
+if sys.version_info >= (3, 8):  # Python version >= 3.8, the tests use the async syntax
+    from tests.aio_cases import TestAsyncioHandler  # noqa: F401
+
+if __name__ == '__main__':
+    import unittest
+    unittest.main()
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import io
+import json
+import logging
+import time
+
+from pylogrus import PyLogrus, JsonFormatter, RateLimitFilter, SampleFilter
+
+
+class TestFilters(unittest.TestCase):
+
+    def get_logger(self, log_filter):
+        logging.setLoggerClass(PyLogrus)
+
+        logger = logging.getLogger(__name__)  # type: PyLogrus
+        logger.setLevel(logging.DEBUG)
+        logger.handlers = []
+
+        self.stream = io.StringIO()
+        handler = logging.StreamHandler(self.stream)
+        handler.setFormatter(JsonFormatter())
+        handler.addFilter(log_filter)
+        logger.addHandler(handler)
+
+        return logger
+
+    def read_records(self):
+        return [json.loads(line) for line in self.stream.getvalue().splitlines()]
+
+    def test_rate_limit(self):
+        log_filter = RateLimitFilter(rate=10, burst=3, fields=('error_code',), summary_interval=None)
+        log = self.get_logger(log_filter)
+
+        for i in range(10):
+            log.withFields({'error_code': 404}).error("Page %s not found", i)
+        log.withFields({'error_code': 500}).error("Page %s not found", 10)
+        self.assertEqual(len(self.read_records()), 4)
+
+        for state in log_filter._states.values():
+            state[1] -= 1  # the burst has ended
+        log.withFields({'error_code': 404}).error("Page %s not found", 11)
+
+        records = self.read_records()
+        self.assertEqual(len(records), 6)
+        self.assertEqual(records[4]['suppressed'], 7)
+        self.assertEqual(records[4]['message'], "7 records like 'Page %s not found' have been suppressed")
+        self.assertEqual(records[5]['message'], "Page 11 not found")
+
+    def test_rate_limit_summary_goes_to_owner(self):
+        log_filter = RateLimitFilter(rate=10, burst=1, summary_interval=None)
+        log = self.get_logger(log_filter)
+        other = io.StringIO()
+        handler = logging.StreamHandler(other)
+        handler.setFormatter(JsonFormatter(enabled_fields=['message']))
+        log.addHandler(handler)
+
+        for i in range(5):
+            log.error("x %s", i)
+        self.assertEqual(len(self.read_records()), 1)
+
+        # Pending counts are reported without waiting for the next record
+        log_filter.flush()
+        records = self.read_records()
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[1]['suppressed'], 4)
+        self.assertEqual([json.loads(line)['message'] for line in other.getvalue().splitlines()],
+                         ["x {}".format(i) for i in range(5)])
+
+    def test_rate_limit_summary_after_burst(self):
+        log_filter = RateLimitFilter(rate=20, burst=1, summary_interval=0.01)
+        log = self.get_logger(log_filter)
+        for i in range(3):
+            log.error("x %s", i)
+
+        deadline = time.time() + 5
+        while len(self.read_records()) < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        records = self.read_records()
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[1]['suppressed'], 2)
+
+    def test_sample(self):
+        log = self.get_logger(SampleFilter(rate=3, key=('msg',)))
+
+        for i in range(10):
+            log.info("Retry %d", i)
+            log.warning("Another message %d", i)
+
+        messages = [r['message'] for r in self.read_records()]
+        self.assertEqual([m for m in messages if m.startswith("Retry")], ["Retry 0", "Retry 3", "Retry 6", "Retry 9"])
+        self.assertEqual(len(messages), 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
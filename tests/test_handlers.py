@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import gzip
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+import six
+
+from pylogrus import PyLogrus, JsonFormatter, TextFormatter, AsyncHandler, BufferedStreamHandler, BufferedFileHandler, \
+    DedupHandler, RotatingHandler
+
+
+class HandlerTestCase(unittest.TestCase):
+
+    def get_logger(self, handler, formatter):
+        logging.setLoggerClass(PyLogrus)
+
+        logger = logging.getLogger(__name__)  # type: PyLogrus
+        logger.setLevel(logging.DEBUG)
+        logger.handlers = []
+
+        handler.setLevel(logging.DEBUG)
+        handler.setFormatter(formatter)
+        logger.addHandler(handler)
+
+        return logger
+
+
+class TestAsyncHandler(HandlerTestCase):
+
+    def test_write_records(self):
+        stream = six.StringIO()
+        handler = AsyncHandler(stream, flush_interval=0.01)
+        log = self.get_logger(handler, JsonFormatter())
+
+        for i in range(100):
+            log.withFields({'num': i}).info("test message")
+        handler.close()
+
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(len(lines), 100)
+        self.assertEqual([json.loads(line)['num'] for line in lines], list(range(100)))
+        self.assertEqual(handler.dropped, 0)
+
+    def test_flush(self):
+        stream = six.StringIO()
+        handler = AsyncHandler(stream, flush_interval=60)
+        log = self.get_logger(handler, TextFormatter(colorize=False))
+
+        log.info("test message")
+        handler.flush()
+        self.assertTrue(stream.getvalue().endswith("test message\n"))
+        handler.close()
+
+    def test_overflow_policies(self):
+        expected = {
+            'drop_newest': ['0', '1', '2'],
+            'drop_oldest': ['7', '8', '9'],
+            'sample': ['2', '5', '8'],
+        }
+        for overflow, messages in expected.items():
+            stream = six.StringIO()
+            handler = AsyncHandler(stream, capacity=3, overflow=overflow, batch_size=10, flush_interval=60,
+                                   sample_rate=3)
+            log = self.get_logger(handler, TextFormatter(fmt="%(message)s", colorize=False))
+
+            for i in range(10):
+                log.info("%d", i)
+            self.assertEqual(handler.dropped, 7)
+            handler.close()
+            self.assertEqual(stream.getvalue().splitlines(), messages)
+
+        with self.assertRaises(ValueError):
+            AsyncHandler(overflow='unknown')
+
+    def test_overflow_block(self):
+        stream = six.StringIO()
+        handler = AsyncHandler(stream, capacity=2, overflow='block', batch_size=10, flush_interval=60)
+        log = self.get_logger(handler, TextFormatter(fmt="%(message)s", colorize=False))
+
+        for i in range(10):
+            log.info("%d", i)
+        handler.close()
+        self.assertEqual(stream.getvalue().splitlines(), [str(i) for i in range(10)])
+        self.assertEqual(handler.dropped, 0)
+
+
+class TestBufferedHandler(HandlerTestCase):
+
+    def test_thresholds(self):
+        stream = six.StringIO()
+        handler = BufferedStreamHandler(stream, capacity=3, flush_interval=None)
+        log = self.get_logger(handler, TextFormatter(fmt="%(message)s", colorize=False))
+
+        log.info("1")
+        log.info("2")
+        self.assertEqual(stream.getvalue(), "")
+        log.info("3")
+        self.assertEqual(stream.getvalue(), "1\n2\n3\n")
+
+        log.info("4")
+        log.error("5")
+        self.assertEqual(stream.getvalue(), "1\n2\n3\n4\n5\n")
+
+        handler.buffer_size = 10
+        log.info("short")
+        self.assertEqual(stream.getvalue(), "1\n2\n3\n4\n5\n")
+        log.info("long message")
+        self.assertTrue(stream.getvalue().endswith("short\nlong message\n"))
+
+    def test_flush_interval(self):
+        stream = six.StringIO()
+        handler = BufferedStreamHandler(stream, flush_interval=0.01)
+        log = self.get_logger(handler, TextFormatter(fmt="%(message)s", colorize=False))
+
+        log.info("test message")
+        for _ in range(100):
+            if stream.getvalue():
+                break
+            time.sleep(0.01)
+        self.assertEqual(stream.getvalue(), "test message\n")
+
+    def test_file(self):
+        with tempfile.NamedTemporaryFile() as temp:
+            handler = BufferedFileHandler(temp.name, delay=True)
+            log = self.get_logger(handler, JsonFormatter())
+
+            log.info("test message")
+            handler.close()
+            with open(temp.name) as f:
+                self.assertEqual(json.loads(f.readlines()[-1])['message'], "test message")
+
+
+class TestDedupHandler(HandlerTestCase):
+
+    def test_consecutive_records(self):
+        stream = six.StringIO()
+        target = logging.StreamHandler(stream)
+        target.setFormatter(JsonFormatter(datefmt='Z'))
+        handler = DedupHandler(target)
+        log = self.get_logger(handler, None)
+
+        for i in range(5):
+            log.withFields({'attempt': 1}).warning("Retry %d", i)
+        log.withFields({'attempt': 2}).warning("Retry %d", 5)
+        log.withFields({'attempt': 2}).warning("Retry %d", 6)
+        log.info("Done")
+        handler.close()
+
+        records = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual([r['message'] for r in records], ["Retry 0", "Retry 4", "Retry 5", "Retry 6", "Done"])
+        self.assertEqual(records[1]['repeated'], 4)
+        six.assertRegex(self, records[1]['first_seen'], r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d{3}Z$")
+        self.assertIn('last_seen', records[1])
+        self.assertEqual(records[3]['repeated'], 1)
+        self.assertNotIn('repeated', records[4])
+
+    def test_time_window(self):
+        stream = six.StringIO()
+        target = logging.StreamHandler(stream)
+        target.setFormatter(TextFormatter(fmt="%(message)s", colorize=False))
+        handler = DedupHandler(target, window=60)
+        self.addCleanup(handler.close)
+        log = self.get_logger(handler, None)
+
+        for i in range(3):
+            log.warning("Retry")
+            log.info("Tick")
+        self.assertEqual(stream.getvalue().splitlines(), ["Retry", "Tick"])
+        handler.flush()
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(len(lines), 4)
+        six.assertRegex(self, lines[2], r"^Retry; first_seen=.+; last_seen=.+; repeated=2$")
+        six.assertRegex(self, lines[3], r"^Tick; first_seen=.+; last_seen=.+; repeated=2$")
+
+    def test_target_level(self):
+        stream = six.StringIO()
+        target = logging.StreamHandler(stream)
+        target.setLevel(logging.WARNING)
+        target.setFormatter(TextFormatter(fmt="%(message)s", colorize=False))
+        handler = DedupHandler(target)
+        log = self.get_logger(handler, None)
+
+        log.debug("Debug")
+        log.info("Info")
+        log.warning("Warning")
+        log.info("Info")
+        handler.close()
+        self.assertEqual(stream.getvalue().splitlines(), ["Warning"])
+
+    def test_window_timer(self):
+        stream = six.StringIO()
+        target = logging.StreamHandler(stream)
+        target.setFormatter(TextFormatter(fmt="%(message)s", colorize=False))
+        handler = DedupHandler(target, window=0.05)
+        self.addCleanup(handler.close)
+        log = self.get_logger(handler, None)
+
+        for _ in range(3):
+            log.warning("Retry")
+        deadline = time.time() + 5
+        while len(stream.getvalue().splitlines()) < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        six.assertRegex(self, stream.getvalue().splitlines()[-1], r"^Retry; first_seen=.+; repeated=2$")
+        handler.close()  # closed again by the cleanup, like by logging.shutdown
+
+
+class TimeFilter(logging.Filter):
+    """Set the creation time of records."""
+
+    def __init__(self, created):
+        super(TimeFilter, self).__init__()
+        self.created = created
+
+    def filter(self, record):
+        record.created = self.created
+        return True
+
+
+class TestRotatingHandler(HandlerTestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tempdir, 'app.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def read_segments(self, handler):
+        lines = []
+        for path in handler.get_segments():
+            with (gzip.open(path, 'rt') if path.endswith('.gz') else io.open(path)) as f:
+                lines += f.read().splitlines()
+        return lines
+
+    def test_rotation_by_size(self):
+        handler = RotatingHandler(self.filename, max_bytes=100)
+        log = self.get_logger(handler, JsonFormatter(enabled_fields=['message']))
+        for i in range(10):
+            log.withFields({'num': i}).info("test message")
+        handler.close()
+
+        segments = handler.get_segments()
+        self.assertEqual(len(segments), 4)
+        self.assertTrue(all(path.endswith('.gz') for path in segments))
+        with open(self.filename) as f:
+            lines = self.read_segments(handler) + f.read().splitlines()
+        self.assertEqual([json.loads(line)['num'] for line in lines], list(range(10)))
+
+    def test_rotation_by_time(self):
+        handler = RotatingHandler(self.filename, when='S', interval=10, compress=None)
+        log = self.get_logger(handler, TextFormatter(fmt='%(message)s', colorize=False))
+        log.info("first")
+        log.info("second")
+        rotated_at = handler._rollover_at
+        time_filter = TimeFilter(rotated_at)
+        log.addFilter(time_filter)
+        self.addCleanup(log.removeFilter, time_filter)
+        log.info("third")
+        handler.close()
+
+        self.assertEqual(self.read_segments(handler), ["first", "second"])
+        with open(self.filename) as f:
+            self.assertEqual(f.read(), "third\n")
+
+    def test_retention(self):
+        handler = RotatingHandler(self.filename, max_bytes=10, backup_count=3, compress=None)
+        log = self.get_logger(handler, TextFormatter(fmt='%(message)s', colorize=False))
+        for i in range(10):
+            log.info("message %d", i)
+        handler.close()
+        self.assertEqual(self.read_segments(handler), ["message 6", "message 7", "message 8"])
+
+        handler = RotatingHandler(self.filename, max_bytes=10, max_total_bytes=25, compress='zstd')
+        log = self.get_logger(handler, TextFormatter(fmt='%(message)s', colorize=False))
+        log.info("message 10")
+        handler.close()
+        self.assertLessEqual(sum(os.path.getsize(path) for path in handler.get_segments()), 25)
+
+    def test_unknown_compression(self):
+        with self.assertRaises(ValueError):
+            RotatingHandler(self.filename, compress='lzma')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import logging
+
+import six
+
+from pylogrus import PyLogrus, JsonFormatter, TextFormatter, AsyncHandler, BufferedStreamHandler, RateLimitFilter, \
+    metrics
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.format = TextFormatter.__dict__['format']
+        metrics.reset()
+        metrics.enable()
+        self.addCleanup(metrics.disable)
+        self.addCleanup(metrics.reset)
+
+    def get_logger(self, *handlers):
+        logging.setLoggerClass(PyLogrus)
+
+        logger = logging.getLogger("{}.{}".format(__name__, self._testMethodName))  # type: PyLogrus
+        logger.setLevel(logging.DEBUG)
+        logger.propagate = False
+        logger.handlers = list(handlers)
+        return logger
+
+    def test_counters_and_timings(self):
+        handler = BufferedStreamHandler(six.StringIO(), flush_interval=None)
+        handler.setFormatter(JsonFormatter())
+        log = self.get_logger(handler)
+        metrics.reset()  # forget serialization of probes by the formatter
+        for i in range(3):
+            log.info("test message")
+        log.error("test message")
+
+        snapshot = metrics.snapshot()
+        logger = (('logger', log.name),)
+        self.assertEqual(snapshot['pylogrus_records_total'], {logger + (('level', 'INFO'),): 3,
+                                                              logger + (('level', 'ERROR'),): 1})
+        self.assertEqual(snapshot['pylogrus_written_bytes_total'][(('handler', 'BufferedStreamHandler'),)],
+                         len(handler.stream.getvalue()))
+        formatter = (('formatter', 'JsonFormatter'),)
+        for name in ('pylogrus_format_seconds', 'pylogrus_serialize_seconds', 'pylogrus_format_time_seconds'):
+            histogram = snapshot[name][formatter]
+            self.assertEqual(histogram['count'], 4)
+            self.assertEqual(histogram['buckets'][-1], (float('inf'), 4))
+            self.assertGreater(histogram['sum'], 0)
+
+    def test_dropped_records(self):
+        handler = AsyncHandler(six.StringIO(), capacity=1, overflow='drop_newest', flush_interval=60)
+        handler.setFormatter(TextFormatter())
+        handler.addFilter(RateLimitFilter(rate=1, burst=2))
+        log = self.get_logger(handler)
+        handler.name = 'async'
+        for i in range(5):
+            log.warning("test message")
+
+        snapshot = metrics.snapshot()
+        labels = (('logger', log.name), ('level', 'WARNING'))
+        self.assertEqual(snapshot['pylogrus_dropped_total'], {labels + (('reason', 'AsyncHandler'),): 1,
+                                                              labels + (('reason', 'RateLimitFilter'),): 3})
+        self.assertEqual(snapshot['pylogrus_queue_depth'][(('handler', 'AsyncHandler'), ('name', 'async'))], 1)
+        handler.close()
+
+    def test_prometheus(self):
+        handler = logging.StreamHandler(six.StringIO())
+        handler.setFormatter(TextFormatter())
+        self.get_logger(handler).info("test message")
+
+        text = metrics.to_prometheus()
+        self.assertIn('# TYPE pylogrus_records_total counter\n', text)
+        self.assertIn('pylogrus_records_total{{logger="{}",level="INFO"}} 1\n'.format(
+            "{}.test_prometheus".format(__name__)), text)
+        self.assertIn('pylogrus_format_seconds_bucket{formatter="TextFormatter",le="+Inf"} 1\n', text)
+        self.assertIn('pylogrus_format_seconds_count{formatter="TextFormatter"} 1\n', text)
+
+    def test_disable(self):
+        metrics.disable()
+        self.assertFalse(metrics.enabled)
+        self.assertNotIn('callHandlers', PyLogrus.__dict__)
+        self.assertIs(TextFormatter.__dict__['format'], self.format)
+        self.get_logger(logging.NullHandler()).info("test message")
+        self.assertEqual(metrics.snapshot().get('pylogrus_records_total', {}), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
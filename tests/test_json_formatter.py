@@ -2,12 +2,19 @@
 
 import unittest
 
+import io
 import json
 import logging
+import logging.handlers
 import sys
 import tempfile
+import time
+import uuid
 
-from pylogrus import PyLogrus, JsonFormatter
+import six
+
+from pylogrus import PyLogrus, Lazy, JsonFormatter, TextFormatter
+from pylogrus.base import FieldsContext
 
 
 class TestJsonFormatter(unittest.TestCase):
@@ -111,6 +118,18 @@ class TestJsonFormatter(unittest.TestCase):
             else:
                 self.assertRegexpMatches(content['asctime'], pattern)
 
+    def test_time_cache(self):
+        formatter = JsonFormatter(datefmt='Z')
+        formatter.converter = time.gmtime
+        record = logging.LogRecord(__name__, logging.INFO, __file__, 0, "test message", None, None)
+        record.created, record.msecs = 1500000000.123, 123.0
+        self.assertEqual(formatter.formatTime(record, 'Z'), '2017-07-14T02:40:00.123Z')
+        record.created, record.msecs = 1500000000.456, 456.0
+        self.assertEqual(formatter.formatTime(record, 'Z'), '2017-07-14T02:40:00.456Z')
+        record.created, record.msecs = 1500000001.789, 789.0
+        self.assertEqual(formatter.formatTime(record, 'Z'), '2017-07-14T02:40:01.789Z')
+        self.assertEqual(formatter.formatTime(record, '%S'), '01')
+
     def test_extra_fields(self):
         formatter = JsonFormatter()
         log = self.get_logger(formatter)
@@ -120,6 +139,26 @@ class TestJsonFormatter(unittest.TestCase):
             self.assertIn('user', content)
             self.assertEqual(content['user'], 'John Doe')
 
+    def test_lazy_fields(self):
+        formatter = JsonFormatter()
+        log = self.get_logger(formatter)
+        calls = []
+
+        def payload(value):
+            calls.append(value)
+            return value
+
+        log.setLevel(logging.INFO)
+        log_ctx = log.withFields({'payload': Lazy(payload, 'computed')})
+        log_ctx.debug("disabled level")
+        self.assertEqual(calls, [])
+
+        log_ctx.info("enabled level")
+        self.assertEqual(calls, ['computed'])
+        with open(self.filename) as f:
+            content = json.loads(f.readlines()[-1])
+            self.assertEqual(content['payload'], 'computed')
+
     def test_contextual_logging(self):
         formatter = JsonFormatter()
         log = self.get_logger(formatter)
@@ -140,6 +179,41 @@ class TestJsonFormatter(unittest.TestCase):
             self.assertIn('company', content)
             self.assertEqual(content['company'], 'Awesome Company')
 
+    def test_contextual_logging_overriding(self):
+        formatter = JsonFormatter()
+        log = self.get_logger(formatter)
+
+        log_ctx = log.withFields({'User': 'John Doe', 'context': 1}).withPrefix("[API]")
+        log_ctx.withFields({'user': 'Admin'}).info("overridden field")
+        with open(self.filename) as f:
+            content = json.loads(f.readlines()[-1])
+            self.assertEqual(content['user'], 'Admin')
+            self.assertEqual(content['context'], 1)
+            self.assertEqual(content['message'], "[API] overridden field")
+
+        log_ctx.info("parent logger")
+        with open(self.filename) as f:
+            content = json.loads(f.readlines()[-1])
+            self.assertEqual(content['user'], 'John Doe')
+
+    def test_disabled_levels(self):
+        formatter = JsonFormatter(enabled_fields=['message', 'funcName'])
+        log = self.get_logger(formatter)
+        log_ctx = log.withFields({'context': 1})
+        log_ctx.process = None  # must not be called for disabled levels
+
+        log.setLevel(logging.WARNING)
+        log_ctx.debug("debug message")
+        log_ctx.info("info message")
+
+        log.setLevel(logging.DEBUG)
+        del log_ctx.process
+        log_ctx.debug("debug message")
+        with open(self.filename) as f:
+            content = json.loads(f.readlines()[-1])
+            self.assertEqual(content['message'], "debug message")
+            self.assertEqual(content['funcName'], "test_disabled_levels")
+
     def test_message_with_prefix(self):
         formatter = JsonFormatter()
         log = self.get_logger(formatter)
@@ -155,6 +229,38 @@ class TestJsonFormatter(unittest.TestCase):
             content = json.loads(f.readlines()[-1])
             self.assertEqual(content['message'], "[API] Another one log message with the prefix")
 
+    def test_message_is_rendered_once(self):
+        log = self.get_logger(JsonFormatter(enabled_fields=['message']))
+        stream = six.StringIO()
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(TextFormatter(fmt="%(message)s", colorize=False))
+        log.addHandler(handler)
+        self.addCleanup(log.removeHandler, handler)
+        log.propagate = False  # handlers of the root logger render messages by themselves
+        self.addCleanup(setattr, log, 'propagate', True)
+
+        calls = []
+
+        class Arg(object):
+            def __str__(self):
+                calls.append('str')
+                return 'arg'
+
+        def payload():
+            calls.append('lazy')
+            return 'computed'
+
+        log.setLevel(logging.INFO)
+        log.withPrefix("[API]").debug("%s %s", Arg(), Lazy(payload))
+        self.assertEqual(calls, [])
+
+        log.withPrefix("[API]").info("%s %s", Arg(), Lazy(payload))
+        self.assertEqual(calls, ['lazy', 'str'])
+        self.assertEqual(stream.getvalue(), "[API] arg computed\n")
+        with open(self.filename) as f:
+            content = json.loads(f.readlines()[-1])
+            self.assertEqual(content['message'], "[API] arg computed")
+
     def test_enabled_fields(self):
         enabled_fields = [
             ('asctime', 'service_timestamp'),
@@ -179,6 +285,126 @@ class TestJsonFormatter(unittest.TestCase):
             self.assertIn('stack_trace', content)
             self.assertIn('function', content)
 
+    def test_disabled_fields_are_not_computed(self):
+        formatter = JsonFormatter(enabled_fields=['message'])
+        formatter.formatTime = None  # asctime must not be evaluated
+        log = self.get_logger(formatter)
+        log.info("test message")
+        with open(self.filename) as f:
+            content = json.loads(f.readlines()[-1])
+            self.assertEqual(content, {'message': 'test message'})
+
+    def test_default_hook(self):
+        formatter = JsonFormatter()
+        log = self.get_logger(formatter)
+        request_id = uuid.uuid4()
+        log.withFields({'request_id': request_id}).info("test message")
+        with open(self.filename) as f:
+            content = json.loads(f.readlines()[-1])
+            self.assertEqual(content['request_id'], str(request_id))
+
+        formatter = JsonFormatter(default=lambda obj: obj.hex)
+        log = self.get_logger(formatter)
+        log.withFields({'request_id': request_id}).info("test message")
+        with open(self.filename) as f:
+            content = json.loads(f.readlines()[-1])
+            self.assertEqual(content['request_id'], request_id.hex)
+
+    def test_serializer(self):
+        formatter = JsonFormatter(serializer=lambda obj: '{"custom": true}')
+        log = self.get_logger(formatter)
+        log.info("test message")
+        with open(self.filename) as f:
+            self.assertEqual(f.readlines()[-1], '{"custom": true}\n')
+
+        for serializer in ('auto', 'orjson', 'rapidjson', 'ujson', 'json'):
+            formatter = JsonFormatter(enabled_fields=['levelname', 'message'], sort_keys=True, serializer=serializer)
+            log = self.get_logger(formatter)
+            log.info("test message")
+            with open(self.filename) as f:
+                content = json.loads(f.readlines()[-1])
+                self.assertEqual(content, {'levelname': 'INFO', 'message': 'test message'})
+
+        with self.assertRaises(ValueError):
+            JsonFormatter(serializer='unknown')
+
+    def test_bound_fields(self):
+        fields = {'service': 'api', 'user': {'id': 42, 'name': 'John Doe'}, 'abc': [1, 2], 'name': 'overridden'}
+        context = FieldsContext(fields)
+        for options in ({}, {'sort_keys': True}, {'indent': 2, 'sort_keys': True}, {'serializer': 'auto'}):
+            formatter = JsonFormatter(enabled_fields=['name', 'levelname', 'message'], **options)
+            record = logging.LogRecord('app', logging.INFO, __file__, 0, 'test ", "levelname": %s', ('x',), None)
+            record.extra_fields = context.resolve()
+            merged = formatter.format(record)
+            spliced = formatter.format(record)  # the fields are encoded when they are reused
+            self.assertEqual(spliced, merged)
+            self.assertEqual(spliced, formatter.format(record))
+            record.extra_fields = dict(fields)
+            self.assertEqual(spliced, formatter.format(record))
+
+            # Fields of a context used for a single record aren't encoded
+            context_fields = context.with_fields({'request_id': 'c0ffee'}).resolve()
+            record.extra_fields = context_fields
+            expected = dict(fields, levelname='INFO', message='test ", "levelname": x', request_id='c0ffee')
+            self.assertEqual(json.loads(formatter.format(record)), expected)
+            self.assertEqual([v for v in context_fields.encoded.values() if isinstance(v, tuple)], [])
+            self.assertEqual(json.loads(formatter.format(record)), expected)
+            # Keys of dicts aren't ordered on Python 2, so unsorted records can't be spliced there
+            self.assertEqual(len(context_fields.encoded), 0 if formatter._layout is None else 1)
+
+    def test_bound_fields_with_traceback(self):
+        for serializer in ('orjson', 'rapidjson', 'ujson', 'json'):
+            formatter = JsonFormatter(enabled_fields=[('traceback', 'a_tb'), 'exception', 'message'], sort_keys=True,
+                                      serializer=serializer)
+            try:
+                raise ValueError("bad value")
+            except ValueError:
+                record = logging.LogRecord('app', logging.ERROR, __file__, 0, "test message", None, sys.exc_info())
+            record.extra_fields = FieldsContext({'f': 1}).resolve()
+
+            content = json.loads(formatter.format(record))
+            self.assertEqual(content['f'], 1)
+            self.assertEqual(content['exception'], 'ValueError')
+            self.assertEqual(content['message'], "test message")
+            self.assertEqual([set(exc) for exc in content['a_tb']], [{'exception', 'message', 'frames'}])
+
+    def test_caller_location(self):
+        logging.setLoggerClass(PyLogrus)
+        log = logging.getLogger("{}.caller_location".format(__name__))  # type: PyLogrus
+        log.setLevel(logging.DEBUG)
+        log.propagate = False
+        self.addCleanup(setattr, log, 'handlers', [])
+
+        records = []
+        handler = logging.StreamHandler(io.StringIO())
+        handler.setFormatter(JsonFormatter(enabled_fields=['message', 'lineno', ('funcName', 'function')]))
+        handler.emit = records.append
+        log.handlers = [handler]
+
+        log.info("test message")
+        self.assertEqual(records[-1].funcName, "test_caller_location")
+        self.assertGreater(records[-1].lineno, 0)
+
+        def helper():
+            log.info("test message", **({'stacklevel': 2} if sys.version_info >= (3, 8) else {}))
+
+        helper()
+        self.assertEqual(records[-1].funcName, "test_caller_location" if sys.version_info >= (3, 8) else "helper")
+
+        handler.setFormatter(JsonFormatter())
+        log.info("test message")
+        self.assertEqual(records[-1].funcName, "(unknown function)")
+
+        log.location = True
+        log.info("test message")
+        self.assertEqual(records[-1].funcName, "test_caller_location")
+        del log.location
+
+        # Handlers which ship records to other processes always get the location
+        self.assertFalse(log.usesLocation())
+        log.handlers = [handler, logging.handlers.HTTPHandler('localhost', '/log')]
+        self.assertTrue(log.usesLocation())
+
     def test_unicode(self):
         formatter = JsonFormatter()
         log = self.get_logger(formatter)
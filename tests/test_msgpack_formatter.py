@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import io
+import logging
+import os
+import shutil
+import tempfile
+
+import six
+
+from pylogrus import PyLogrus, JsonFormatter, MsgPackFormatter, MsgPackDecoder, RotatingHandler, iter_records
+from pylogrus import AsyncHandler, BufferedStreamHandler, CollectorHandler, RingHandler
+from pylogrus import msgpack_formatter
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class TestMsgPackFormatter(unittest.TestCase):
+
+    def get_logger(self, formatter):
+        logging.setLoggerClass(PyLogrus)
+
+        logger = logging.getLogger("{}.{}".format(__name__, self._testMethodName))  # type: PyLogrus
+        logger.setLevel(logging.DEBUG)
+        logger.propagate = False
+
+        self.stream = io.BytesIO()
+        if six.PY2:  # stream handlers of Python 2 append a newline to records
+            handler = BufferedStreamHandler(self.stream, buffer_size=0)
+        else:
+            handler = logging.StreamHandler(self.stream)
+        handler.terminator = b''
+        handler.setFormatter(formatter)
+        logger.handlers = [handler]
+
+        return logger
+
+    def read_records(self):
+        return list(iter_records(io.BytesIO(self.stream.getvalue())))
+
+    def test_round_trip(self):
+        formatter = MsgPackFormatter(enabled_fields=[('levelname', 'level'), 'message', 'exception'])
+        formatter.override_level_names({'WARNING': 'WARN'})
+        log = self.get_logger(formatter)
+
+        log.withFields({'user': {'id': 42, 'tags': ['a', 'b']}, 'none': None}).warning("test message")
+        log.withFields({'ratio': 0.5, 'ok': True}).info("second message")
+
+        self.assertEqual(self.read_records(), [
+            {'level': 'WARN', 'message': "test message", 'exception': None, 'user': {'id': 42, 'tags': ['a', 'b']},
+             'none': None},
+            {'level': 'INFO', 'message': "second message", 'exception': None, 'ratio': 0.5, 'ok': True},
+        ])
+
+    def test_smaller_than_json(self):
+        log = self.get_logger(MsgPackFormatter(datefmt='Z'))
+        stream = six.StringIO()
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(JsonFormatter(datefmt='Z'))
+        log.addHandler(handler)
+
+        for i in range(100):
+            log.withFields({'request_id': i, 'status': 200}).info("request handled")
+        self.assertLess(len(self.stream.getvalue()), len(stream.getvalue().encode('utf-8')) * 0.8)
+        self.assertEqual(len(self.read_records()), 100)
+
+    def test_dictionary(self):
+        formatter = MsgPackFormatter(enabled_fields=['message'], max_names=2)
+        log = self.get_logger(formatter)
+        log.withFields({'a': 1}).info("message")
+        size = len(self.stream.getvalue())
+        log.withFields({'a': 2}).info("message")
+        self.assertEqual(len(self.stream.getvalue()) - size, size - 4 - len(msgpack_formatter._make_packer(str)(
+            [0, ['message', 'a']])))
+
+        # Names beyond the limit are sent in every record
+        log.withFields({'b': 3}).info("message")
+
+        # A new stream starts with the dictionary
+        formatter.reset()
+        first = len(self.stream.getvalue())
+        log.withFields({'a': 4}).info("message")
+
+        records = self.read_records()
+        self.assertEqual([r.get('a', r.get('b')) for r in records], [1, 2, 3, 4])
+        self.assertEqual(list(iter_records(io.BytesIO(self.stream.getvalue()[first:]))),
+                         [{'message': "message", 'a': 4}])
+
+    def test_lost_dictionary(self):
+        log = self.get_logger(MsgPackFormatter(enabled_fields=['message']))
+        log.info("first")
+        data = self.stream.getvalue()
+        log.withFields({'user': 'John'}).info("second")
+
+        # The stream without the first dictionary frame
+        size, = msgpack_formatter._FRAME_HEADER.unpack_from(data)
+        stream = io.BytesIO(self.stream.getvalue()[msgpack_formatter._FRAME_HEADER.size + size:])
+        self.assertEqual(list(iter_records(stream)), [{0: "first"}, {0: "second", 'user': 'John'}])
+
+    def test_bound_fields(self):
+        log = self.get_logger(MsgPackFormatter(enabled_fields=['message', 'levelname']))
+        log_ctx = log.withFields({'service': 'billing', 'levelname': 'custom'})
+        log_ctx.info("first")
+        log_ctx.withFields({'user': 'John'}).info("second")
+        log_ctx.info("third")
+
+        self.assertEqual(self.read_records(), [
+            {'message': "first", 'service': 'billing', 'levelname': 'custom'},
+            {'message': "second", 'service': 'billing', 'levelname': 'custom', 'user': 'John'},
+            {'message': "third", 'service': 'billing', 'levelname': 'custom'},
+        ])
+
+    def test_decoder_chunks(self):
+        log = self.get_logger(MsgPackFormatter(enabled_fields=['message']))
+        for i in range(5):
+            log.info("message %d", i)
+
+        decoder = MsgPackDecoder()
+        data = self.stream.getvalue()
+        records = []
+        for i in range(0, len(data), 7):
+            records.extend(decoder.feed(data[i:i + 7]))
+        self.assertEqual(records, [{'message': "message {}".format(i)} for i in range(5)])
+
+    def test_rotating_handler(self):
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        filename = os.path.join(tempdir, 'app.mpk')
+
+        handler = RotatingHandler(filename, max_bytes=50, compress=None, mode='ab')
+        handler.terminator = b''
+        handler.setFormatter(MsgPackFormatter(enabled_fields=['message']))
+        log = self.get_logger(None)
+        log.handlers = [handler]
+        for i in range(10):
+            log.info("message %d", i)
+        handler.close()
+
+        messages = []
+        for name in handler.get_segments() + [filename]:
+            with open(name, 'rb') as f:
+                messages.extend(r['message'] for r in iter_records(f))
+        self.assertGreater(len(handler.get_segments()), 1)
+        self.assertEqual(messages, ["message {}".format(i) for i in range(10)])
+
+    def test_binary_handlers(self):
+        log = self.get_logger(None)
+        for handler in (AsyncHandler(self.stream, flush_interval=0.01), BufferedStreamHandler(self.stream)):
+            handler.terminator = b''
+            handler.setFormatter(MsgPackFormatter(enabled_fields=['message']))
+            log.handlers = [handler]
+            for i in range(3):
+                log.info("message %d", i)
+            handler.close()
+
+        self.assertEqual([r['message'] for r in self.read_records()], ["message {}".format(i) for i in range(3)] * 2)
+
+    def test_unsupported_handlers(self):
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+
+        # Dictionary frames are overwritten in the ring and streams of processes are merged by the collector
+        for handler in (RingHandler(os.path.join(tempdir, 'app.ring'), capacity=4096),
+                        CollectorHandler(os.path.join(tempdir, 'collector.sock'))):
+            self.addCleanup(handler.close)
+            self.assertRaises(ValueError, handler.setFormatter, MsgPackFormatter())
+            handler.setFormatter(JsonFormatter())
+
+    @unittest.skipUnless(msgpack, "msgpack is not installed")
+    def test_pure_python_encoder(self):
+        obj = {'int': [0, 1, -1, -33, 127, 128, 255, 256, 70000, 2 ** 32, -2 ** 40, 2 ** 63],
+               'str': ['', 'x' * 31, 'x' * 32, 'x' * 300, 'x' * 70000, u'юникод'], 'float': 1.5,
+               'bin': b'\x00\x01', 'nested': {str(i): [None, True, False] for i in range(20)}}
+        out = []
+        msgpack_formatter._pack(obj, str, out)
+        data = b''.join(out)
+        self.assertEqual(data, msgpack.packb(obj, use_bin_type=True))
+        self.assertEqual(msgpack_formatter._unpack(data), (msgpack.unpackb(data, raw=False), len(data)))
+
+
+if __name__ == '__main__':
+    unittest.main()
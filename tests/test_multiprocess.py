@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+from pylogrus import PyLogrus, JsonFormatter, CollectorHandler, LogCollector
+
+
+def worker(address, num):
+    logging.setLoggerClass(PyLogrus)
+
+    logger = logging.getLogger("{}.worker".format(__name__))  # type: PyLogrus
+    logger.setLevel(logging.DEBUG)
+    logger.handlers = []
+
+    handler = CollectorHandler(address)
+    handler.setFormatter(JsonFormatter())
+    logger.addHandler(handler)
+
+    for i in range(100):
+        logger.withFields({'worker': num, 'num': i}).info("x" * 8192)
+    handler.close()
+
+
+@unittest.skipUnless(hasattr(os, 'fork'), "requires fork")
+class TestLogCollector(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.address = os.path.join(self.tempdir, 'collector.sock')
+        self.filename = os.path.join(self.tempdir, 'app.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_collect_records(self):
+        collector = LogCollector(self.address, filename=self.filename)
+        collector.start(timeout=10)
+
+        ctx = multiprocessing.get_context('fork') if hasattr(multiprocessing, 'get_context') else multiprocessing
+        workers = [ctx.Process(target=worker, args=(self.address, num)) for num in range(4)]
+        for p in workers:
+            p.start()
+        for p in workers:
+            p.join()
+        collector.stop()
+
+        with open(self.filename) as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(len(records), 400)
+        for num in range(4):
+            self.assertEqual([r['num'] for r in records if r['worker'] == num], list(range(100)))
+
+    def test_collector_unavailable(self):
+        handler = CollectorHandler(self.address, retry_interval=60)
+        record = logging.makeLogRecord({'msg': "test message"})
+        handler.handle(record)
+        handler.handle(record)
+        self.assertEqual(handler.dropped, 2)
+        handler.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import json
+import logging
+import logging.handlers
+import pickle
+
+import six
+
+from pylogrus import PyLogrus, JsonFormatter, TextFormatter, PyLogrusRecord, record_factory
+
+
+class RecordsFilter(logging.Filter):
+    """Keep handled records."""
+
+    def __init__(self):
+        super(RecordsFilter, self).__init__()
+        self.records = []
+
+    def filter(self, record):
+        self.records.append(record)
+        return True
+
+
+class TestPyLogrusRecord(unittest.TestCase):
+
+    def get_logger(self, formatter, factory):
+        logging.setLoggerClass(PyLogrus)
+
+        logger = logging.getLogger(__name__)  # type: PyLogrus
+        logger.setLevel(logging.DEBUG)
+        logger.handlers = []
+        logger.record_factory = factory
+
+        self.stream = six.StringIO()
+        handler = logging.StreamHandler(self.stream)
+        handler.setFormatter(formatter)
+        logger.addHandler(handler)
+
+        return logger
+
+    def test_json_output(self):
+        enabled_fields = ['name', 'asctime', ('levelname', 'level'), 'message', ('threadName', 'thread_name')]
+        records = RecordsFilter()
+        log = self.get_logger(JsonFormatter(enabled_fields=enabled_fields), record_factory(enabled_fields))
+        log.handlers[0].addFilter(records)
+
+        log.withFields({'user': 'John Doe'}).withPrefix("[API]").info("test %s", "message")
+        content = json.loads(self.stream.getvalue())
+        self.assertEqual(content['message'], "[API] test message")
+        self.assertEqual(content['level'], 'INFO')
+        self.assertEqual(content['thread_name'], 'MainThread')
+        self.assertEqual(content['user'], 'John Doe')
+
+        record = records.records[0]
+        self.assertIsInstance(record, PyLogrusRecord)
+        self.assertEqual(record.__dict__['extra_fields'], {'user': 'John Doe'})
+        self.assertEqual(record.__dict__['prefix'], "[API]")
+        self.assertIsNone(record.module)
+        self.assertIsNone(record.processName)
+
+    def test_pickled_by_socket_handler(self):
+        records = RecordsFilter()
+        log = self.get_logger(JsonFormatter(), record_factory(['message']))
+        log.handlers[0].addFilter(records)
+        log.withFields({'user': 'John Doe'}).withPrefix("[API]").info("test %s", "message")
+
+        data = logging.handlers.SocketHandler('localhost', 0).makePickle(records.records[0])
+        record = logging.makeLogRecord(pickle.loads(data[4:]))
+        self.assertEqual(record.extra_fields, {'user': 'John Doe'})
+        self.assertEqual(record.prefix, "[API]")
+        self.assertEqual(record.getMessage(), "test message")
+
+    def test_text_output(self):
+        formatter = TextFormatter(fmt="%(levelname)s %(module)s %(prefix)s|%(message)s", colorize=False)
+        log = self.get_logger(formatter, record_factory())
+        log.withPrefix("[API]").info("test message")
+        self.assertEqual(self.stream.getvalue(), "INFO test_record [API]|[API] test message\n")
+
+        with self.assertRaises(KeyError):
+            log.info("test message", extra={'levelname': 'INFO'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import io
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+
+from pylogrus import PyLogrus, JsonFormatter, RingHandler, read_ring
+from pylogrus.ring import main
+
+
+class TestRingHandler(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tempdir, 'app.ring')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def get_logger(self, handler):
+        logging.setLoggerClass(PyLogrus)
+
+        logger = logging.getLogger("{}.{}".format(__name__, self._testMethodName))  # type: PyLogrus
+        logger.setLevel(logging.DEBUG)
+        logger.propagate = False
+        logger.handlers = [handler]
+        handler.setFormatter(JsonFormatter(enabled_fields=['message']))
+        self.addCleanup(handler.close)
+        return logger
+
+    def test_read_records(self):
+        log = self.get_logger(RingHandler(self.filename, capacity=4096))
+        for i in range(10):
+            log.withFields({'num': i}).info("test message")
+
+        records = [json.loads(line) for line in read_ring(self.filename)]
+        self.assertEqual(records, [{'message': "test message", 'num': i} for i in range(10)])
+
+    def test_wraparound(self):
+        handler = RingHandler(self.filename, capacity=1000)
+        log = self.get_logger(handler)
+        for i in range(1000):
+            log.withFields({'num': i}).info("test message")
+
+        nums = [json.loads(line)['num'] for line in read_ring(self.filename)]
+        self.assertEqual(nums, list(range(1000 - len(nums), 1000)))
+        self.assertGreater(len(nums), 10)
+
+        # The ring is continued after reopening
+        handler.close()
+        log = self.get_logger(RingHandler(self.filename, capacity=1000))
+        log.withFields({'num': 1000}).info("test message")
+        self.assertEqual(json.loads(list(read_ring(self.filename))[-1])['num'], 1000)
+
+    def test_torn_records(self):
+        handler = RingHandler(self.filename, capacity=4096)
+        log = self.get_logger(handler)
+        for i in range(3):
+            log.withFields({'num': i}).info("test message")
+        handler.close()
+
+        lines = list(read_ring(self.filename))
+        with io.open(self.filename, 'r+b') as f:
+            # Damage the second record and leave garbage of an unfinished record after the last one
+            f.seek(64 + len(lines[0]) + 16 + 20)
+            f.write(b'!')
+            f.seek(64 + sum(len(line) + 16 for line in lines))
+            f.write(b'\x10\x00\x00\x00garbage')
+
+        nums = [json.loads(line)['num'] for line in read_ring(self.filename)]
+        self.assertEqual(nums, [0, 2])
+
+    def test_too_large_record(self):
+        handler = RingHandler(self.filename, capacity=64)
+        log = self.get_logger(handler)
+        log.info("x" * 100)
+        self.assertEqual(handler.dropped, 1)
+        self.assertEqual(list(read_ring(self.filename)), [])
+
+    def test_not_ring_file(self):
+        with open(self.filename, 'wb') as f:
+            f.write(b'\x00' * 128)
+        with self.assertRaises(ValueError):
+            list(read_ring(self.filename))
+
+    def test_reader_utility(self):
+        log = self.get_logger(RingHandler(self.filename, capacity=4096))
+        log.info("test message")
+
+        output = os.path.join(self.tempdir, 'output')
+        with open(output, 'w') as stdout:
+            self.addCleanup(setattr, sys, 'stdout', sys.stdout)
+            sys.stdout = stdout
+            main([self.filename])
+        with open(output) as f:
+            self.assertEqual(f.read(), '{"message": "test message"}\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
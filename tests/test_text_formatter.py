@@ -6,7 +6,7 @@ import logging
 import sys
 import tempfile
 
-from pylogrus import PyLogrus, TextFormatter, CL_TXTGRN, CL_TXTBLU, CL_BLDYLW, CL_TXTRST
+from pylogrus import PyLogrus, Lazy, TextFormatter, CL_TXTGRN, CL_TXTBLU, CL_BLDYLW, CL_TXTRST
 
 
 class TestTextFormatter(unittest.TestCase):
@@ -117,6 +117,26 @@ class TestTextFormatter(unittest.TestCase):
             content = f.readlines()[-1]
             self.assertIn("; user=John Doe", content)
 
+    def test_lazy_fields(self):
+        formatter = TextFormatter(colorize=False)
+        log = self.get_logger(formatter)
+        calls = []
+
+        def payload(value):
+            calls.append(value)
+            return value
+
+        log.setLevel(logging.INFO)
+        log_ctx = log.withFields({'payload': Lazy(payload, 'computed')})
+        log_ctx.debug("disabled level")
+        self.assertEqual(calls, [])
+
+        log_ctx.info("enabled level")
+        self.assertEqual(calls, ['computed'])
+        with open(self.filename) as f:
+            content = f.readlines()[-1]
+            self.assertIn("; payload=computed", content)
+
     def test_contextual_logging(self):
         formatter = TextFormatter(colorize=False)
         log = self.get_logger(formatter)
@@ -167,6 +187,18 @@ class TestTextFormatter(unittest.TestCase):
             self.assertIn(" {}INFO{} ".format(CL_BLDYLW, CL_TXTRST), content)
             self.assertIn("; {}user{}={}John Doe{}".format(CL_TXTBLU, CL_TXTRST, CL_TXTRST, CL_TXTRST), content)
 
+    def test_record_is_not_modified(self):
+        formatter = TextFormatter(colorize=True)
+        formatter.override_level_names({'INFO': 'INFORMATION'})
+        record = logging.LogRecord(__name__, logging.INFO, __file__, 0, "test %s", ("message",), None)
+        record.prefix = "[API]"
+        content = formatter.format(record)
+        self.assertIn(" {}INFORMATION{} ".format(CL_TXTGRN, CL_TXTRST), content)
+        self.assertTrue(content.endswith("[API] {}test message".format(CL_TXTRST)))
+        self.assertEqual(record.levelname, 'INFO')
+        self.assertFalse(hasattr(record, 'asctime'))
+        self.assertFalse(hasattr(record, 'message'))
+
     def test_message_format(self):
         fmt = "%(levelname)-8s %(message)s"
         formatter = TextFormatter(fmt=fmt, colorize=False)
@@ -176,6 +208,24 @@ class TestTextFormatter(unittest.TestCase):
             content = f.readlines()[-1]
             self.assertEqual("INFO     test message\n", content)
 
+    def test_format_styles(self):
+        record = logging.LogRecord('app', logging.INFO, __file__, 7, "test %s", ("message",), None)
+        cases = [
+            ("%(levelname)-8s|%(name)s:%(lineno)03d %(message)s 100%%", '%',
+             "{}INFO{}    |app:007 test message 100%".format(CL_TXTGRN, CL_TXTRST)),
+            ("{levelname:>8}|{name!r} {message}", '{', "    {}INFO{}|'app' test message".format(CL_TXTGRN, CL_TXTRST)),
+            ("${levelname}|$name $message $$", '$', "{}INFO{}|app test message $".format(CL_TXTGRN, CL_TXTRST)),
+        ]
+        for fmt, style, expected in cases:
+            formatter = TextFormatter(fmt=fmt, style=style, colorize=True)
+            self.assertEqual(expected, formatter.format(record))
+
+    def test_level_name_precision(self):
+        formatter = TextFormatter(fmt="%(levelname).4s %(message)s", colorize=True)
+        record = logging.LogRecord('app', logging.CRITICAL, __file__, 0, "test message", None, None)
+        prefix = "{}CRIT{} ".format(formatter.color['critical'], CL_TXTRST)
+        self.assertTrue(formatter.format(record).startswith(prefix))
+
     def test_unicode(self):
         formatter = TextFormatter(colorize=False)
         log = self.get_logger(formatter)
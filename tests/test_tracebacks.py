@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import json
+import logging
+import sys
+
+import six
+
+from pylogrus import PyLogrus, JsonFormatter, TextFormatter, traceback_cache
+from pylogrus.tracebacks import TracebackCache
+
+
+def fail(n):
+    if n:
+        return fail(n - 1)
+    raise ValueError("failed")
+
+
+def fail_chained():
+    try:
+        fail(0)
+    except ValueError as e:
+        raise_from(RuntimeError("chained"), e)
+
+
+def raise_from(exc, cause):
+    exc.__cause__ = cause
+    raise exc
+
+
+def exc_info(func, *args):
+    try:
+        func(*args)
+    except Exception:
+        return sys.exc_info()
+
+
+class TestTracebackCache(unittest.TestCase):
+
+    def setUp(self):
+        traceback_cache.clear()
+
+    def test_same_as_logging(self):
+        formatter = logging.Formatter()
+        for ei in (exc_info(fail, 3), exc_info(fail_chained), (ValueError, ValueError("no traceback"), None)):
+            self.assertEqual(JsonFormatter().formatException(ei), formatter.formatException(ei))
+
+    def test_cache_is_shared(self):
+        logging.setLoggerClass(PyLogrus)
+
+        logger = logging.getLogger(__name__)  # type: PyLogrus
+        logger.setLevel(logging.DEBUG)
+        logger.propagate = False
+        self.addCleanup(setattr, logger, 'propagate', True)
+        streams = []
+        for formatter in (JsonFormatter(enabled_fields=['message', 'stacktrace']), TextFormatter(colorize=False)):
+            streams.append(six.StringIO())
+            handler = logging.StreamHandler(streams[-1])
+            handler.setFormatter(formatter)
+            logger.addHandler(handler)
+            self.addCleanup(logger.removeHandler, handler)
+
+        for i in range(5):
+            try:
+                fail(2)
+            except ValueError:
+                logger.exception("Attempt %d failed", i)
+
+        # The text is formatted once per record, the second formatter reuses ``exc_text`` of the record
+        self.assertEqual((traceback_cache.misses, traceback_cache.hits), (1, 4))
+        records = [json.loads(line) for line in streams[0].getvalue().splitlines()]
+        self.assertEqual(len(records), 5)
+        self.assertTrue(records[0]['stacktrace'].endswith("ValueError: failed"))
+        self.assertIn(records[0]['stacktrace'], streams[1].getvalue())
+
+    def test_lru(self):
+        cache = TracebackCache(maxsize=2)
+        infos = [exc_info(fail, n) for n in range(3)]
+        for ei in infos + infos[2:] + infos[:1]:
+            cache.format_exception(ei)
+        self.assertEqual((cache.misses, cache.hits), (4, 1))
+
+    def test_structured_traceback(self):
+        formatter = JsonFormatter(enabled_fields=['message', 'traceback'], max_frames=2)
+        record = logging.LogRecord('test', logging.ERROR, __file__, 1, "error", None, exc_info(fail_chained))
+        content = json.loads(formatter.format(record))
+        if six.PY3:  # exceptions aren't chained on Python 2
+            self.assertEqual([(e['exception'], e['message']) for e in content['traceback']],
+                             [('RuntimeError', 'chained'), ('ValueError', 'failed')])
+            self.assertEqual([f['function'] for f in content['traceback'][1]['frames']], ['fail_chained', 'fail'])
+            self.assertEqual(content['traceback'][1]['frames'][1]['line'], 'raise ValueError("failed")')
+        else:
+            self.assertEqual([(e['exception'], e['message']) for e in content['traceback']],
+                             [('RuntimeError', 'chained')])
+            self.assertEqual([f['function'] for f in content['traceback'][0]['frames']], ['fail_chained', 'raise_from'])
+
+        formatter = JsonFormatter(enabled_fields=['traceback'], max_depth=1)
+        self.assertEqual(len(json.loads(formatter.format(record))['traceback']), 1)
+        record.exc_info = None
+        self.assertEqual(json.loads(formatter.format(record)), {'traceback': None})
+
+
+if __name__ == '__main__':
+    unittest.main()